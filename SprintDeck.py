@@ -1,20 +1,35 @@
 import streamlit as st
-import requests
+import ado_http
+import ado_replay
+from request_scheduler import scheduler
+from fanout import fan_out, Incomplete
+from http_cache import SWR, IMMUTABLE
+from single_flight import flights, query_key
+from export_utils import work_items_frame, parquet_download, csv_download, save_export, PARQUET_MIME, CSV_MIME
 import pandas as pd
 from requests.auth import HTTPBasicAuth
 from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor
 import urllib.parse
-import re
 import plotly.express as px
-from datetime import datetime
-from io import BytesIO
+from datetime import datetime, timedelta
 from resource_view import render_resource_view
-from governance_service import get_area_governance_report
+from governance_service import get_area_governance_report, build_governance_rollup, get_area_drilldown
+from governance_history import record_snapshot, load_history, health_trend, period_deltas, today
+from area_rollup import AreaRollup
+from work_item_links import pull_request_url
+from webhooks import start_receiver, recent_events
+from hierarchy import portfolio_rollup
+from revision_history import changers
+from revision_repository import revisions
+from identities import identities, NOBODY
+import delivery_service
+from delivery_service import history_key
+from trend_store import compute_sprint_kpis, save_snapshot, load_trend, start_backfill, backfill_running, backfill_failures
+from flow_metrics import build_transitions, item_flow, time_in_state, flow_percentile_chart, wip_chart
 import plotly.express as px
-import io
-import matplotlib.pyplot as plt
-import matplotlib.colors as mcolors
+import cpu_pool
+from report_render import summarize_delivery, html_table, excel_workbook, governance_workbook
+from config import STORY_TYPES
 
 # ======================
 # CONFIG & BEAUTIFICATION
@@ -39,9 +54,8 @@ ORG = "lloydsregistergroup"
 PAT = st.secrets["AZURE_DEVOPS_PAT"]
 #PAT = ""  # Replace with your actual PAT or use secrets management
 AUTH = HTTPBasicAuth("", PAT)
+start_receiver(ORG, AUTH)
 HEADERS = {"Content-Type": "application/json"}
-STORY_TYPES = ["User Story", "Requirement", "Product Backlog Item"]
-CLOSED_STATES = {"Closed", "Resolved", "Done", "Completed"}
 date_map_lookup = {}
 
 # ======================
@@ -51,7 +65,7 @@ date_map_lookup = {}
 def get_all_projects(org, _auth):  # Added underscore to _auth
     url = f"https://dev.azure.com/{org}/_apis/projects?api-version=7.1&$top=1000"
     try:
-        res = requests.get(url, auth=_auth) # Use the underscored name inside
+        res = ado_http.get(url, auth=_auth, cache=SWR) # Use the underscored name inside
         if res.status_code == 200:
             projects = [p['name'] for p in res.json()['value']]
             return sorted(projects)
@@ -63,7 +77,7 @@ def get_all_projects(org, _auth):  # Added underscore to _auth
 def get_iteration_paths(project_name):
     url = f"https://dev.azure.com/{ORG}/{urllib.parse.quote(project_name)}/_apis/wit/classificationNodes/Iterations?$depth=5&api-version=7.0"
     try:
-        r = requests.get(url, auth=AUTH)
+        r = ado_http.get(url, auth=AUTH, cache=SWR)
         all_paths = []
         def walk(node, current_path):
             name = node.get('name', '')
@@ -78,7 +92,7 @@ def get_iteration_paths(project_name):
 def get_area_paths(project_name):
     url = f"https://dev.azure.com/{ORG}/{urllib.parse.quote(project_name)}/_apis/wit/classificationNodes/Areas?$depth=5&api-version=7.0"
     try:
-        r = requests.get(url, auth=AUTH)
+        r = ado_http.get(url, auth=AUTH, cache=SWR)
         all_paths = []
         def walk(node, current_path):
             name = node.get('name', '')
@@ -89,57 +103,47 @@ def get_area_paths(project_name):
         return sorted(all_paths)
     except: return []
 
-def get_pr_creator(url):
-    try:
-        parts = urllib.parse.unquote(url).split('/')
-        api = f"https://dev.azure.com/{ORG}/_apis/git/repositories/{parts[-2]}/pullrequests/{parts[-1]}?api-version=7.0"
-        res = requests.get(api, auth=AUTH).json()
-        return res.get("createdBy", {}).get("displayName", "Unknown")
-    except: return None
-
-def fetch_details(ids):
-    wi_map = {}
-    if not ids: return wi_map
-    ids = list(set([str(i) for i in ids]))
-    for i in range(0, len(ids), 200):
-        batch = ids[i:i+200]
-        url = f"https://dev.azure.com/{ORG}/_apis/wit/workitems?ids={','.join(batch)}&$expand=relations&api-version=7.0"
-        r = requests.get(url, auth=AUTH)
-        if r.status_code == 200:
-            for item in r.json().get("value", []):
-                f = item.get("fields", {})
-                rel_ids, pr_links = [], []
-                for rel in item.get('relations', []):
-                    rel_url = rel.get('url', '')
-                    m = re.search(r'/workItems/(\d+)$', rel_url)
-                    if m: rel_ids.append(m.group(1))
-                    if 'PullRequestId' in rel_url or 'pullRequests' in rel_url: pr_links.append(rel_url)
-                
-                wi_map[item["id"]] = {
-                    "id": item["id"],
-                    "type": f.get("System.WorkItemType"),
-                    "state": f.get("System.State"),
-                    "title": f.get("System.Title"),
-                    "assigned_to": f.get("System.AssignedTo", {}).get("displayName", "Unassigned") if isinstance(f.get("System.AssignedTo"), dict) else "Unassigned",
-                    "created_by": f.get("System.CreatedBy", {}).get("displayName", "Unknown") if isinstance(f.get("System.CreatedBy"), dict) else "Unknown",
-                    "story_points": f.get("Microsoft.VSTS.Scheduling.StoryPoints", 0),
-                    "pr_links": pr_links, "raw_links": rel_ids
-                }
-    return wi_map
-
-@st.cache_data(ttl=3600, show_spinner=False)
-def get_developer_when_in_progress(work_item_id, project):
-    url = f"https://dev.azure.com/{ORG}/{urllib.parse.quote(project)}/_apis/wit/workItems/{work_item_id}/revisions?api-version=7.0"
-    try:
-        response = requests.get(url, auth=AUTH)
-        if response.status_code == 200:
-            for rev in response.json().get("value", []):
-                fields = rev.get("fields", {})
-                if fields.get("System.State", "") in ["In Progress", "Active"]:
-                    assigned = fields.get("System.AssignedTo", {})
-                    return assigned.get("displayName", "Unknown") if isinstance(assigned, dict) else assigned
-    except: pass
-    return "Not Found"
+def get_pr_creator(pr):
+    repo, pr_id = pr
+    r = ado_http.get(pull_request_url(ORG, repo, pr_id), auth=AUTH, cache=IMMUTABLE)
+    r.raise_for_status()
+    return identities.intern(r.json().get("createdBy"))
+
+def get_revision_history(work_item_id, project, closed=False, rev=None):
+    # Shared with the Resource view and every session: one download per (id, Rev)
+    return revisions.get(ORG, project, work_item_id, AUTH, closed=closed, rev=rev)
+
+def load_delivery_data(project, path_filter):
+    return delivery_service.load_delivery_data(ORG, project, path_filter, AUTH)
+
+def render_scheduler_stats():
+    with st.sidebar.expander("🔌 API Scheduler", expanded=False):
+        stats = scheduler.stats()
+        if not stats:
+            st.caption("No Azure DevOps requests yet.")
+        for budget in stats.values():
+            q = budget["queued"]
+            st.caption(
+                f"Queued: {q['interactive']} interactive / {q['background']} background · "
+                f"In flight: {budget['in_flight']} / limit {budget['limit']} · Sessions waiting: {budget['sessions_waiting']}"
+            )
+            st.caption(
+                f"Wait avg {budget['wait_avg_ms']} ms · p95 {budget['wait_p95_ms']} ms · "
+                f"Served {budget['served']} · Throttled {budget['throttles']}"
+            )
+        repo = revisions.stats()
+        st.caption(f"Revision cache: {repo['items']} items · {repo['hits']} hits / {repo['misses']} misses")
+        if ado_replay.replayer is not None:
+            st.caption(f"⏪ Offline replay of {ado_replay.replayer.path} · {ado_replay.replayer.misses} misses")
+        elif ado_replay.recorder is not None:
+            st.caption(f"⏺️ Recording ADO traffic to {ado_replay.recorder.path} · {ado_replay.recorder.count} calls")
+        events = recent_events()
+        if events:
+            last = events[-1]
+            st.caption(f"Webhooks: {len(events)} recent · last {last['event']} #{last['id']} at {last['received']}")
+
+def wi_link(wid):
+    return f'<a href="https://dev.azure.com/{ORG}/_workitems/edit/{wid}" target="_blank">{wid}</a>'
 
 def reset_search():
     st.session_state.search_attempted = False
@@ -161,6 +165,7 @@ view_mode = st.radio(
     ["Delivery Execution", "Resource Execution", "Squad Governance"],
     horizontal=True
 )
+render_scheduler_stats()
 
 if view_mode == "Squad Governance":
     st.title("🛡️ Project Governance & Squad Health")
@@ -186,13 +191,28 @@ if view_mode == "Squad Governance":
     if run_btn:
         st.session_state.search_attempted = True
         with st.spinner("Crunching Azure DevOps Data..."):
-            df_result = get_area_governance_report(ORG, sel_proj, lookback, AUTH, STORY_TYPES)
-            
+            complete = True
+            try:
+                df_result = flights.do(
+                    query_key("governance", sel_proj, int(lookback)),
+                    lambda: get_area_governance_report(ORG, sel_proj, lookback, AUTH, STORY_TYPES)
+                )
+            except Incomplete as e:
+                df_result, complete = e.value, False
+                st.warning(f"⚠️ {len(e.failed)} {e.what} could not be loaded after retries; the counts below exclude them and no snapshot was stored.")
+
             if not df_result.empty and (df_result["Total Stories"].sum() + df_result["Bugs Found"].sum() > 0):
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M")
+                # A partial report would show up in the health history as a dip
+                if complete:
+                    record_snapshot(sel_proj, df_result, lookback)
+                    save_export(df_result, f"Gov_Report_{sel_proj}_{timestamp}")
                 st.session_state.gov_results = {
                     "df": df_result,
+                    "rollup": build_governance_rollup(df_result),
                     "project": sel_proj,
-                    "timestamp": datetime.now().strftime("%Y%m%d_%H%M")
+                    "lookback": int(lookback),
+                    "timestamp": timestamp
                 }
             else:
                 st.session_state.gov_results = None
@@ -244,68 +264,63 @@ if view_mode == "Squad Governance":
         )
         st.plotly_chart(fig_health, use_container_width=True, key="gov_plotly")
         
+        # --- Week-over-week deltas from the local snapshot history (no API re-scan) ---
+        history = load_history(res['project'], start=today() - timedelta(days=365), lookback=res.get("lookback"))
+        wow_df = period_deltas(history)
+        table_df = df.merge(wow_df[["Full Area Path", "Δ Health Score"]], on="Full Area Path", how="left")
+
         # --- Data Table (Now shows QA Bugs and UAT Bugs automatically from df) ---
         st.dataframe(
-            df.drop(columns=["Full Area Path"], errors='ignore'), 
+            table_df.drop(columns=["Full Area Path"], errors='ignore'), 
             hide_index=True, 
             use_container_width=True
         )
 
-        # --- 4. MATPLOTLIB FOR EXCEL (Unchanged) ---
-        image_data = io.BytesIO()
-        try:
-            plt.figure(figsize=(10, 5))
-            norm = mcolors.Normalize(vmin=0, vmax=100) 
-            cmap = plt.get_cmap('RdYlGn')
-            bar_colors = [cmap(norm(value)) for value in df["Health Score"]]
-            bars = plt.bar(df["Squad Name"], df["Health Score"], color=bar_colors, edgecolor='black', linewidth=0.5)
-            
-            for bar in bars:
-                height = bar.get_height()
-                plt.text(
-                    bar.get_x() + bar.get_width()/2.,
-                    height + 1,
-                    f'{height:.1f}%',
-                    ha='center', va='bottom',
-                    fontsize=10, fontweight='bold'
-                )
-
-            plt.title(f"Squad Health Overview: {res['project']}", fontsize=14, pad=20)
-            plt.ylabel("Health Score (%)", fontsize=12)
-            plt.ylim(0, 110)
-            plt.xticks(rotation=45, ha='right')
-            plt.grid(axis='y', linestyle='--', alpha=0.3)
-            plt.tight_layout()
-            
-            plt.savefig(image_data, format='png', dpi=100)
-            plt.close()
-            image_data.seek(0)
-        except Exception as e:
-            image_data = None
-            st.error(f"Excel Chart Error: {e}")
-
-        # --- 5. EXCEL EXPORT ---
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            # The exported excel sheet will also contain the new QA/UAT columns
-            df.to_excel(writer, index=False, sheet_name='Data_Report')
-            
-            if image_data:
-                workbook = writer.book
-                worksheet = workbook.add_worksheet('Dashboard')
-                header_format = workbook.add_format({'bold': True, 'font_size': 14, 'font_color': '#0078d4'})
-                worksheet.write('B2', f"Governance Report: {res['project']}", header_format)
-                worksheet.write('B3', f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
-                worksheet.insert_image('B5', 'health_chart.png', {'image_data': image_data})
+        # --- Health Trend ---
+        trend_days = st.selectbox("📈 Health Trend Window", [30, 90, 180, 365], index=1, format_func=lambda d: f"{d} Days", key="gov_trend_days")
+        trend = health_trend(history[history["Date"] >= today() - timedelta(days=trend_days)])
+        if len(trend) > 1:
+            st.plotly_chart(
+                px.line(trend, markers=True, labels={"value": "Health Score", "Date": "Snapshot", "Full Area Path": "Area Path"}, title="Squad Health Trend"),
+                use_container_width=True, key="gov_trend"
+            )
+        else:
+            st.caption("Health trend appears once more than one daily snapshot is stored.")
+
+        # --- Area Drill-Down (subtree totals from the precomputed rollup) ---
+        rollup = res.get("rollup") or build_governance_rollup(df)
+        st.markdown("#### 🌳 Area Drill-Down")
+        drill_path = st.selectbox(
+            "Parent Area",
+            rollup.paths(),
+            format_func=lambda p: f"{'— ' * rollup.node(p).depth}{rollup.node(p).name}",
+            key="gov_drill_path"
+        )
+        drill_df = get_area_drilldown(rollup, drill_path)
+        if not drill_df.empty:
+            st.dataframe(drill_df.drop(columns=["Full Area Path"]), hide_index=True, use_container_width=True)
+
+        # --- 4/5. EXCEL EXPORT (native chart over Data_Report, rendered in the worker pool on click) ---
+        excel_bytes = cpu_pool.deferred(
+            governance_workbook, df, res['project'], datetime.now().strftime('%Y-%m-%d %H:%M'),
+            [("Health_WoW", wow_df), ("Health_History", history)], rows=len(df)
+        )
 
         # --- 6. DOWNLOAD BUTTON ---
         st.sidebar.download_button(
             label="📥 Download Excel Report",
-            data=output.getvalue(),
+            data=excel_bytes,
             file_name=f"Gov_Report_{res['project']}.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             key="gov_export_stable"
         )
+        st.sidebar.download_button(
+            label="📦 Download Parquet",
+            data=parquet_download(df),
+            file_name=f"Gov_Report_{res['project']}.parquet",
+            mime=PARQUET_MIME,
+            key="gov_export_parquet"
+        )
     
     elif st.session_state.search_attempted and st.session_state.gov_results is None:
         st.warning(f"No activity found for '{sel_proj}' in the last {lookback} days.")    
@@ -349,82 +364,56 @@ if view_mode == "Delivery Execution":
                     st.caption(f"📅 **Sprint Duration:** {s_date} to {e_date}")
         with c3: load_btn = st.button("🚀 Load Dashboard", type="primary", use_container_width=True)
 
+    # --- SPRINT TREND (rendered straight from stored snapshots) ---
+    if not is_kanban and sel_project:
+        pending = start_backfill(ORG, sel_project, AUTH, date_map_lookup)
+        trend_df = load_trend(sel_project)
+        if len(trend_df) > 1:
+            with st.expander("📈 Sprint-over-Sprint Trend", expanded=False):
+                t1, t2 = st.columns(2)
+                with t1:
+                    st.plotly_chart(px.line(trend_df, x="Sprint", y=["Stories", "Closed", "Points"], markers=True, title="Velocity & Closure"), use_container_width=True)
+                with t2:
+                    st.plotly_chart(px.line(trend_df, x="Sprint", y=["Bugs Found", "Bugs Fixed", "Test Cases"], markers=True, title="Quality"), use_container_width=True)
+        if pending and backfill_running(sel_project):
+            st.caption(f"⏳ Backfilling {pending} closed sprint(s) in the background…")
+        trend_failures = backfill_failures(sel_project)
+        if trend_failures and not backfill_running(sel_project):
+            w1, w2 = st.columns([5, 1], vertical_alignment="center")
+            with w1:
+                st.warning(f"⚠️ {len(trend_failures)} closed sprint(s) could not be snapshotted and are missing from the trend.")
+            with w2:
+                if st.button("🔁 Retry", key="trend_retry"):
+                    start_backfill(ORG, sel_project, AUTH, date_map_lookup, retry_failed=True)
+                    st.rerun()
+
     if load_btn and sel_path:
         with st.spinner("🔄 Fetching Data..."):
-            query = f"SELECT [System.Id] FROM WorkItems WHERE {path_filter}"
-            api_url = f"https://dev.azure.com/{ORG}/{urllib.parse.quote(sel_project)}/_apis/wit/wiql?api-version=7.0"
-            r = requests.post(api_url, json={"query": query}, auth=AUTH, headers=HEADERS)
-            
-            if r.status_code == 200:
-                sprint_ids = [wi['id'] for wi in r.json().get('workItems', [])]
-                data_map = fetch_details(sprint_ids)
+            # Identical loads from other sessions attach to the one already running
+            try:
+                loaded = flights.do(
+                    query_key("delivery", sel_project, path_filter),
+                    lambda: load_delivery_data(sel_project, path_filter)
+                )
+            except Incomplete as e:
+                loaded = e.value
+                st.warning(f"⚠️ {len(e.failed)} {e.what} could not be loaded after retries; their Dev column shows Unavailable.")
+
+            if loaded is not None:
+                data_map, dev_results, hierarchy = loaded
                 story_ids = [sid for sid, i in data_map.items() if i["type"] in STORY_TYPES]
-                
-                with ThreadPoolExecutor(max_workers=10) as executor:
-                    dev_results = dict(executor.map(lambda sid: (sid, get_developer_when_in_progress(sid, sel_project)), story_ids))
-                
-                m_stats = {"ts": 0, "cs": 0, "bi": 0, "bf": 0, "tc": 0}
-                qa_activity, bug_creators, linkage_table = defaultdict(int), defaultdict(list), []
-                active_users, all_pr_urls = set(), set()
+                if not is_kanban:
+                    save_snapshot(sel_project, sel_path, compute_sprint_kpis(data_map.values()), date_map_lookup.get(sel_path))
 
-                for sid, item in data_map.items():
-                    t, s, assigned, creator = item["type"], item["state"], item["assigned_to"], item["created_by"]
-                    if assigned != "Unassigned": active_users.add(assigned)
-                    for url in item["pr_links"]: all_pr_urls.add(url)
-
-                    if t in STORY_TYPES:
-                        m_stats["ts"] += 1
-                        if s in CLOSED_STATES: m_stats["cs"] += 1
-
-                        # Linked bugs for this story
-                        bugs_links = [
-                            f'<a href="https://dev.azure.com/{ORG}/_workitems/edit/{int(lid)}" target="_blank">{lid}</a> ({data_map[int(lid)]["state"]})'
-                            for lid in item["raw_links"]
-                            if int(lid) in data_map and data_map[int(lid)]["type"] == "Bug"
-                        ]
-
-                        linkage_table.append({
-                            "Type": t,
-                            "ID": f'<a href="https://dev.azure.com/{ORG}/_workitems/edit/{sid}" target="_blank">{sid}</a>',
-                            "Title": item["title"],
-                            "Status": s,
-                            "Points": item.get("story_points", 0),
-                            "Bugs": ", ".join(bugs_links) if bugs_links else "—",
-                            "Dev": dev_results.get(sid, "N/A")
-                        })
-
-                    elif t == "Bug":
-                        m_stats["bi"] += 1
-                        if s in CLOSED_STATES: m_stats["bf"] += 1
-                        bug_creators[creator].append(f'{sid} ({s})')
-
-                        # Independent bug entry in linkage table
-                        # Only if it is not linked to a story
-                        is_linked = any(
-                            sid in item2.get("raw_links", [])
-                            for item2 in data_map.values()
-                            if item2["type"] in STORY_TYPES
-                        )
-                        if not is_linked:
-                            linkage_table.append({
-                                "Type": t,
-                                "ID": f'<a href="https://dev.azure.com/{ORG}/_workitems/edit/{sid}" target="_blank">{sid}</a>',
-                                "Title": item["title"],
-                                "Status": s,
-                                "Points": 0,
-                                "Bugs": "—",
-                                "Dev": dev_results.get(sid, "N/A")
-                            })
-
-                    elif t == "Test Case":
-                        m_stats["tc"] += 1
-                        qa_activity[assigned] += 1
-
-
-                pr_lookup = {}
-                if all_pr_urls:
-                    with ThreadPoolExecutor(max_workers=10) as exe:
-                        pr_lookup = dict(zip(all_pr_urls, list(exe.map(get_pr_creator, list(all_pr_urls)))))
+                # Inline: shipping data_map to a worker costs more than the tally itself
+                summary = summarize_delivery(data_map, dev_results)
+                m_stats, qa_activity, bug_creators = summary["m_stats"], summary["qa_activity"], summary["bug_creators"]
+                linkage_table, active_users, all_prs = summary["linkage_table"], summary["active_users"], summary["all_prs"]
+
+                prs = fan_out(get_pr_creator, all_prs)
+                pr_lookup = prs.results
+                if prs.failed:
+                    st.warning(f"⚠️ {len(prs.failed)} pull requests could not be loaded after retries; PR counts below exclude them.")
 
                 # --- KPI & HEALTH SECTION ---
                 st.markdown('<div class="section-header">📈 KPI Performance Metrics</div>', unsafe_allow_html=True)
@@ -455,44 +444,45 @@ if view_mode == "Delivery Execution":
                 with k7:
                     st.markdown(f'<div class="health-card" style="background-color: {health_color};">💖 Sprint Health: {health_label}</div>', unsafe_allow_html=True)
 
+                # --- FLOW METRICS (from the revisions already fetched for the Dev column) ---
+                histories = fan_out(lambda sid: get_revision_history(sid, sel_project, *history_key(data_map[sid])), story_ids)
+                if histories.failed:
+                    st.warning(f"⚠️ {len(histories.failed)} story histories could not be loaded after retries; flow metrics below exclude them.")
+                transitions = build_transitions(histories.results)
+                flow_df = item_flow(transitions)
+                if not flow_df.empty:
+                    st.markdown('<div class="section-header">⏱️ Flow Metrics</div>', unsafe_allow_html=True)
+                    f1, f2 = st.columns(2)
+                    with f1:
+                        fig_pct = flow_percentile_chart(flow_df, "Story Cycle & Lead Time Percentiles (days)")
+                        if fig_pct: st.plotly_chart(fig_pct, use_container_width=True)
+                    with f2:
+                        fig_wip = wip_chart(transitions, "Stories In Progress by Day")
+                        if fig_wip: st.plotly_chart(fig_wip, use_container_width=True)
+                    state_df = time_in_state(transitions)
+                    state_df["Avg Days"] = (state_df["hours"] / 24 / state_df["items"]).round(1)
+                    st.dataframe(
+                        state_df.rename(columns={"state": "State", "items": "Items"})[["State", "Items", "Avg Days"]],
+                        hide_index=True, use_container_width=True
+                    )
+
                 # --- RESOURCE MATRIX (KANBAN ONLY) ---
                 # --- RESOURCE PERFORMANCE MATRIX (KANBAN ONLY) ---
                 # --- RESOURCE PERFORMANCE MATRIX (KANBAN ONLY | FIXED) ---
                 if is_kanban:
                     st.markdown('<div class="section-header">👥 Team Contribution Matrix (Kanban)</div>', unsafe_allow_html=True)
 
-                    # contribution[area][person] → counts
-                    contribution = defaultdict(lambda: defaultdict(lambda: {
-                        "User Stories": 0,
-                        "Bugs": 0,
-                        "PRs": 0
-                    }))
-
-                    # cache revision calls
-                    @st.cache_data(ttl=3600, show_spinner=False)
-                    def get_contributors(work_item_id, project):
-                        url = f"https://dev.azure.com/{ORG}/{urllib.parse.quote(project)}/_apis/wit/workItems/{work_item_id}/revisions?api-version=7.0"
-                        users = set()
-                        try:
-                            r = requests.get(url, auth=AUTH)
-                            if r.status_code == 200:
-                                for rev in r.json().get("value", []):
-                                    fields = rev.get("fields", {})
-                                    changed_by = fields.get("System.ChangedBy")
-                                    if isinstance(changed_by, dict):
-                                        users.add(changed_by.get("displayName"))
-                        except:
-                            pass
-                        return users
-
-                    # --- Collect contributors ---
-                    with ThreadPoolExecutor(max_workers=10) as exe:
-                        revision_results = dict(
-                            exe.map(lambda sid: (sid, get_contributors(sid, sel_project)), data_map.keys())
-                        )
+                    # leaf_stats[area][(identity id, metric)] → counts, rolled up the area tree below
+                    leaf_stats = defaultdict(lambda: defaultdict(int))
+
+                    # --- Collect contributors (histories come from the shared revision repository) ---
+                    contributors = fan_out(lambda sid: changers(get_revision_history(sid, sel_project, *history_key(data_map[sid]))), data_map.keys())
+                    revision_results = contributors.results
+                    if contributors.failed:
+                        st.warning(f"⚠️ {len(contributors.failed)} work item histories could not be loaded after retries; the matrix below excludes them.")
 
                     for wid, item in data_map.items():
-                        area = item.get("area_path", sel_path)
+                        area = item.get("area_path") or sel_path
                         wtype = item["type"]
 
                         # STORY / BUG contributions
@@ -501,41 +491,47 @@ if view_mode == "Delivery Execution":
                                 if not user:
                                     continue
                                 if wtype in STORY_TYPES:
-                                    contribution[area][user]["User Stories"] += 1
+                                    leaf_stats[area][(user, "User Stories")] += 1
                                 elif wtype == "Bug":
-                                    contribution[area][user]["Bugs"] += 1
+                                    leaf_stats[area][(user, "Bugs")] += 1
 
                         # PR contributions
-                        for pr_url in item["pr_links"]:
-                            pr_owner = pr_lookup.get(pr_url)
+                        for pr in item["pr_links"]:
+                            pr_owner = pr_lookup.get(pr)
                             if pr_owner:
-                                contribution[area][pr_owner]["PRs"] += 1
-
-                    # --- Render UI ---
-                    for area, members in contribution.items():
-                        st.subheader(f"📐 Area Path: {area}")
-
-                        rows = []
-                        for person, stats in members.items():
-                            rows.append({
-                                "Team Member": person,
-                                **stats,
-                                "Total": sum(stats.values())
-                            })
-
-                        df = pd.DataFrame(rows).sort_values("Total", ascending=False)
-
-                        st.dataframe(
-                            df,
-                            use_container_width=True,
-                            hide_index=True
-                        )
-
-                    # --- Save for Excel ---
+                                leaf_stats[area][(pr_owner, "PRs")] += 1
+
+                    area_rollup = AreaRollup(leaf_stats)
+
+                    def members_of(stats):
+                        members = defaultdict(lambda: {"User Stories": 0, "Bugs": 0, "PRs": 0})
+                        for (person, metric), count in stats.items():
+                            members[person][metric] += count
+                        return members
+
+                    # --- Render UI (each area shows its whole subtree, from the selected path down) ---
+                    for node in area_rollup.walk(sel_path):
+                        members = members_of(node.total)
+                        if not members:
+                            continue
+
+                        with st.expander(f"📐 Area Path: {node.path}", expanded=not node.children):
+                            df = pd.DataFrame([
+                                {"Team Member": identities.name(person), **stats, "Total": sum(stats.values())}
+                                for person, stats in members.items()
+                            ]).sort_values("Total", ascending=False)
+
+                            st.dataframe(
+                                df,
+                                use_container_width=True,
+                                hide_index=True
+                            )
+
+                    # --- Save for Excel (own counts per area, so nothing is double counted) ---
                     res_stats = {
-                        f"{area} | {person}": stats
-                        for area, members in contribution.items()
-                        for person, stats in members.items()
+                        f"{node.path} | {identities.name(person)}": stats
+                        for node in area_rollup.walk(sel_path)
+                        for person, stats in members_of(node.own).items()
                     }
 
                 
@@ -546,33 +542,55 @@ if view_mode == "Delivery Execution":
 
                 # --- LINKAGE MATRIX ---
                 st.markdown('<div class="section-header">🔗 User Story & Bug Linkage Matrix</div>', unsafe_allow_html=True)
-                st.write(pd.DataFrame(linkage_table).to_html(escape=False, index=False), unsafe_allow_html=True)
+                linkage_df = pd.DataFrame(linkage_table, columns=["Type", "ID", "Title", "Status", "Points", "Bugs", "Dev"])
+                linkage_html = linkage_df.assign(
+                    ID=linkage_df["ID"].map(wi_link),
+                    Bugs=linkage_df["Bugs"].map(lambda bugs: ", ".join(f"{wi_link(b)} ({bs})" for b, bs in bugs) or "—")
+                )
+                st.write(cpu_pool.run(html_table, linkage_html, rows=len(linkage_html), escape=False, index=False), unsafe_allow_html=True)
+
+                # --- PORTFOLIO ROLLUP (Epic → Feature) ---
+                portfolio_df = portfolio_rollup(hierarchy, data_map.keys())
+                if not portfolio_df.empty:
+                    st.markdown('<div class="section-header">🏛️ Portfolio Rollup (Epics & Features)</div>', unsafe_allow_html=True)
+                    epics = portfolio_df[portfolio_df["Level"] == "Epic"]
+                    features = portfolio_df[portfolio_df["Level"] == "Feature"]
+                    shown = ["ID", "Title", "State", "Stories", "Closed Stories", "Completion %", "Points", "Bugs", "Open Bugs"]
+                    for _, epic in epics.iterrows():
+                        with st.expander(f"🏔️ Epic {epic['ID']}: {epic['Title']} — {epic['Completion %']}% complete"):
+                            st.dataframe(features[features["Parent"] == epic["ID"]][shown], hide_index=True, use_container_width=True)
+                    orphans = features[features["Parent"].isna()]
+                    if not orphans.empty:
+                        with st.expander("🧩 Features without an Epic"):
+                            st.dataframe(orphans[shown], hide_index=True, use_container_width=True)
 
                 # --- DEVELOPER PR ACTIVITY ---
                 st.markdown('<div class="section-header">👨‍💻 Developers Activity (PRs)</div>', unsafe_allow_html=True)
                 dev_pr_map = defaultdict(set)
                 for sid, item in data_map.items():
-                    link = f'<a href="https://dev.azure.com/{ORG}/_workitems/edit/{sid}" target="_blank">{sid}</a>'
-                    for url in item["pr_links"]:
-                        name = pr_lookup.get(url)
-                        if name: dev_pr_map[name].add(f"{link} ({item['state']})")
+                    for pr in item["pr_links"]:
+                        name = pr_lookup.get(pr)
+                        if name: dev_pr_map[name].add((sid, item['state']))
                 if dev_pr_map:
-                    st.write(pd.DataFrame([{"Developer": d, "Items": len(v), "Work Items": ", ".join(list(v))} for d, v in dev_pr_map.items()]).to_html(escape=False, index=False), unsafe_allow_html=True)
+                    st.write(pd.DataFrame([
+                        {"Developer": identities.name(d), "Items": len(v), "Work Items": ", ".join(f"{wi_link(w)} ({ws})" for w, ws in v)}
+                        for d, v in dev_pr_map.items()
+                    ]).to_html(escape=False, index=False), unsafe_allow_html=True)
 
                 # --- SPRINT CONTRIBUTORS ---
                 st.markdown('<div class="section-header">👥 Sprint Contributors</div>', unsafe_allow_html=True)
                 contrib_data = defaultdict(lambda: {"Stories":0, "Bugs":0, "Test Cases":0, "PRs":0})
                 for sid, item in data_map.items():
-                    u, t = item["assigned_to"], item["type"]
-                    if u != "Unassigned":
+                    u, t = item.assigned_id, item.type
+                    if u != NOBODY:
                         if t in STORY_TYPES: contrib_data[u]["Stories"] += 1
                         elif t == "Bug": contrib_data[u]["Bugs"] += 1
                         elif t == "Test Case": contrib_data[u]["Test Cases"] += 1
-                    for url in item["pr_links"]:
-                        p_name = pr_lookup.get(url)
+                    for pr in item["pr_links"]:
+                        p_name = pr_lookup.get(pr)
                         if p_name: contrib_data[p_name]["PRs"] += 1
                 if contrib_data:
-                    st.write(pd.DataFrame([{"Contributor": k, **v} for k, v in contrib_data.items()]).to_html(index=False), unsafe_allow_html=True)
+                    st.write(pd.DataFrame([{"Contributor": identities.name(k), **v} for k, v in contrib_data.items()]).to_html(index=False), unsafe_allow_html=True)
                 
                 st.markdown("""
                     <style>
@@ -595,13 +613,13 @@ if view_mode == "Delivery Execution":
 
                 with q1:
                     st.write("**Test Cases Created**")
-                    qa_df = pd.DataFrame([{"QA Name": n, "Count": c} for n, c in qa_activity.items()])
+                    qa_df = pd.DataFrame([{"QA Name": identities.name(n, "Unassigned"), "Count": c} for n, c in qa_activity.items()])
                     st.write(qa_df.to_html(index=False), unsafe_allow_html=True)
 
                 with q2:
                     st.write("**Bugs Created By**")
                     bugs_logged_df = pd.DataFrame([
-                        {"Creator": c, "Total Bugs": len(l), "Bug IDs": ", ".join(l)} 
+                        {"Creator": identities.name(c), "Total Bugs": len(l), "Bug IDs": ", ".join(l)} 
                         for c, l in bug_creators.items()
                     ])
                     
@@ -641,25 +659,26 @@ if view_mode == "Delivery Execution":
                     {"Metric": "Sprint Health", "Value": health_label}
                 ]
                 kpi_df = pd.DataFrame(kpi_data)
+                # Numeric block under the KPI table for the native chart to bind to
+                kpi_counts_df = pd.DataFrame({
+                    "KPI": ["Total Stories", "Stories Closed", "Bugs Identified", "Bugs Fixed", "Test Cases"],
+                    "Count": [m_stats["ts"], m_stats["cs"], m_stats["bi"], m_stats["bf"], m_stats["tc"]]
+                })
+                kpi_counts_row = len(kpi_df) + 3
+
+                # 2. Linkage Matrix (built from the plain columns, no HTML to strip)
+                linkage_df_xl = linkage_df.assign(
+                    Bugs=linkage_df["Bugs"].map(lambda bugs: ", ".join(f"{b} ({bs})" for b, bs in bugs) or "—")
+                )
 
-                # 2. Linkage Matrix (Cleaned for Excel)
-                linkage_df_xl = pd.DataFrame(linkage_table).copy()
-                if not linkage_df_xl.empty:
-                    linkage_df_xl['ID'] = linkage_df_xl['ID'].str.replace(r'<[^>]*>', '', regex=True)
-                    linkage_df_xl['Bugs'] = linkage_df_xl['Bugs'].str.replace(r'<[^>]*>', '', regex=True)
-
-                # 3. Developer PRs (Cleaned for Excel)
-                # Use .get() or check if dev_pr_map exists to avoid similar NameErrors
+                # 3. Developer PRs
                 pr_df_xl = pd.DataFrame([
-                    {"Developer": d, "Items": len(v), "Work Items": ", ".join(list(v))}
+                    {"Developer": identities.name(d), "Items": len(v), "Work Items": ", ".join(f"{w} ({ws})" for w, ws in v)}
                     for d, v in dev_pr_map.items()
-                ]) if 'dev_pr_map' in locals() else pd.DataFrame()
-
-                if not pr_df_xl.empty:
-                    pr_df_xl['Work Items'] = pr_df_xl['Work Items'].str.replace(r'<[^>]*>', '', regex=True)
+                ])
 
                 # 4. Contributors
-                contrib_df = pd.DataFrame([{"Contributor": k, **v} for k, v in contrib_data.items()])
+                contrib_df = pd.DataFrame([{"Contributor": identities.name(k), **v} for k, v in contrib_data.items()])
 
                 # 5. Resource Performance (FIX: Added check for res_stats existence)
                 if 'res_stats' in locals():
@@ -672,37 +691,25 @@ if view_mode == "Delivery Execution":
                 # ======================
 
 
-            # Create Excel file in memory using BytesIO
-            output = BytesIO()
-
-            # Use ExcelWriter to write the data into the memory
-            with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-                # Write your dataframes to different sheets (similar to your code)
-                kpi_df.to_excel(writer, sheet_name="Summary_KPIs", index=False)
-                
-                if not linkage_df_xl.empty:
-                    linkage_df_xl.to_excel(writer, sheet_name="UserStory_Bug_Linkage", index=False)
-                
-                if not contrib_df.empty:
-                    contrib_df.to_excel(writer, sheet_name="Team_Contributors", index=False)
-                
-                if not pr_df_xl.empty:
-                    pr_df_xl.to_excel(writer, sheet_name="Developer_PR_Activity", index=False)
-                
-                if not res_matrix_df.empty:
-                    res_matrix_df.to_excel(writer, sheet_name="Resource_Performance", index=False)
-                
-                if not qa_df.empty:
-                    qa_df.to_excel(writer, sheet_name="QA_Test_Cases", index=False)
-                
-                if not bugs_logged_df.empty:
-                    bugs_logged_df.to_excel(writer, sheet_name="Bugs_Logged_By", index=False)
-
-            # Finalize and get the processed data
-            processed_data = output.getvalue()
-
-            # Make sure to move the cursor back to the start of the BytesIO object
-            output.seek(0)
+            # Rendered off the script thread, and only when the download is clicked
+            processed_data = cpu_pool.deferred(excel_workbook, [
+                ("Summary_KPIs", kpi_df),
+                ("Summary_KPIs", kpi_counts_df, kpi_counts_row),
+                ("UserStory_Bug_Linkage", linkage_df_xl),
+                ("Team_Contributors", contrib_df),
+                ("Developer_PR_Activity", pr_df_xl),
+                ("Resource_Performance", res_matrix_df),
+                ("Portfolio_Rollup", portfolio_df),
+                ("QA_Test_Cases", qa_df),
+                ("Bugs_Logged_By", bugs_logged_df),
+            ], [
+                {"sheet": "Summary_KPIs", "startrow": kpi_counts_row, "categories": "KPI", "values": ["Count"],
+                 "title": "Sprint KPIs", "labels": True, "anchor": "D2"},
+                {"sheet": "Resource_Performance", "type": "bar", "categories": "Resource",
+                 "values": [c for c in ["User Stories", "Bugs", "PRs"] if c in res_matrix_df],
+                 "title": "Contributions by Area | Resource", "anchor": "F2",
+                 "size": (900, max(360, 22 * len(res_matrix_df)))},
+            ], rows=len(data_map))
 
             # Now you can pass the processed_data to the download button
             st.sidebar.download_button(
@@ -712,6 +719,25 @@ if view_mode == "Delivery Execution":
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                 key="download_btn"
             )
+
+            # --- COLUMNAR EXPORTS (Parquet / CSV straight from the work-item frame) ---
+            items_df = work_items_frame(data_map)
+            export_name = f"Delivery_WorkItems_{datetime.now().strftime('%Y%m%d')}"
+            save_export(items_df, export_name)
+            st.sidebar.download_button(
+                label="📦 Download Work Items (Parquet)",
+                data=parquet_download(items_df),
+                file_name=f"{export_name}.parquet",
+                mime=PARQUET_MIME,
+                key="download_parquet"
+            )
+            st.sidebar.download_button(
+                label="📄 Download Work Items (CSV)",
+                data=csv_download(items_df),
+                file_name=f"{export_name}.csv",
+                mime=CSV_MIME,
+                key="download_csv"
+            )
 # Footer
 st.markdown(
     "<div style='text-align:center;color:gray;font-size:12px;'>"
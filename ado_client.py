@@ -1,6 +1,8 @@
 # ado_client.py
 import streamlit as st
-import requests
+import ado_http
+from http_cache import SWR
+from work_items import parse_work_item
 from requests.auth import HTTPBasicAuth
 import urllib.parse
 
@@ -11,18 +13,17 @@ PAT = st.secrets["AZURE_DEVOPS_PAT"]
 AUTH = HTTPBasicAuth("", PAT)
 HEADERS = {"Content-Type": "application/json"}
 
-STORY_TYPES = ["User Story", "Requirement", "Product Backlog Item"]
 
 @st.cache_data(ttl=3600)
 def get_all_projects():
     url = f"https://dev.azure.com/{ORG}/_apis/projects?api-version=6.0"
-    r = requests.get(url, auth=AUTH)
+    r = ado_http.get(url, auth=AUTH, cache=SWR)
     return sorted(p["name"] for p in r.json().get("value", []))
 
 @st.cache_data(ttl=3600)
 def get_area_paths(project):
     url = f"https://dev.azure.com/{ORG}/{urllib.parse.quote(project)}/_apis/wit/classificationNodes/Areas?$depth=5&api-version=7.0"
-    r = requests.get(url, auth=AUTH)
+    r = ado_http.get(url, auth=AUTH, cache=SWR)
 
     paths = []
 
@@ -41,7 +42,7 @@ def fetch_work_items(project, area):
     query = f"SELECT [System.Id] FROM WorkItems WHERE [System.AreaPath] UNDER '{area}'"
 
     wiql_url = f"https://dev.azure.com/{ORG}/{urllib.parse.quote(project)}/_apis/wit/wiql?api-version=7.0"
-    r = requests.post(wiql_url, json={"query": query}, auth=AUTH)
+    r = ado_http.post(wiql_url, json={"query": query}, auth=AUTH)
     ids = [i["id"] for i in r.json().get("workItems", [])]
 
     if not ids:
@@ -51,17 +52,9 @@ def fetch_work_items(project, area):
     for i in range(0, len(ids), 200):
         batch = ids[i:i+200]
         url = f"https://dev.azure.com/{ORG}/_apis/wit/workitems?ids={','.join(map(str,batch))}&api-version=7.0"
-        r = requests.get(url, auth=AUTH)
+        r = ado_http.get(url, auth=AUTH)
 
-        for wi in r.json().get("value", []):
-            f = wi["fields"]
-            data[wi["id"]] = {
-                "id": wi["id"],
-                "type": f.get("System.WorkItemType"),
-                "title": f.get("System.Title"),
-                "state": f.get("System.State"),
-                "assigned_to": f.get("System.AssignedTo", {}).get("displayName", "Unassigned"),
-                "story_points": f.get("Microsoft.VSTS.Scheduling.StoryPoints", 0)
-            }
+        for item in map(parse_work_item, r.json().get("value", [])):
+            data[item.id] = item
 
     return data
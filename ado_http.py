@@ -0,0 +1,102 @@
+# ado_http.py
+
+import os
+import time
+import threading
+import urllib.parse
+import requests
+import http_cache
+import ado_replay
+from request_scheduler import scheduler, session_context, BACKGROUND
+
+DEFAULT_RETRY_AFTER = 5.0
+
+ADO_HOST = "https://dev.azure.com"
+# Point every call at another host (e.g. the load-test mock); cache keys keep the real URL
+BASE_URL = os.environ.get("ADO_BASE_URL", "").rstrip("/")
+
+
+def _retry_after(response):
+    if response.status_code != 429 and "Retry-After" not in response.headers:
+        return None
+    try:
+        return float(response.headers.get("Retry-After", DEFAULT_RETRY_AFTER))
+    except ValueError:
+        return DEFAULT_RETRY_AFTER
+
+
+def endpoint_class(url):
+    """The API an URL calls, ids and query dropped (e.g. "wit/workitems/revisions")."""
+    path = urllib.parse.urlsplit(url).path.lower().rstrip("/")
+    _, _, api = path.partition("/_apis/")
+    return "/".join(part for part in api.split("/") if not part.isdigit()) or path
+
+
+def _wire(method, url, target, auth, kwargs):
+    replayer = ado_replay.replayer
+    if replayer is not None:
+        headers = kwargs.get("headers") or {}
+        conditional = "If-None-Match" in headers or "If-Modified-Since" in headers
+        return replayer.serve(method, url, kwargs.get("json"), conditional)
+    return requests.request(method, target, auth=auth, **kwargs)
+
+
+def _send(method, url, auth=None, priority=None, cache_key=None, **kwargs):
+    endpoint = endpoint_class(url)
+    target = BASE_URL + url[len(ADO_HOST):] if BASE_URL and url.startswith(ADO_HOST) else url
+    queued = time.monotonic()
+    with scheduler.slot(auth, priority, endpoint) as slot:
+        recorder = ado_replay.recorder
+        start = time.monotonic()
+        try:
+            response = _wire(method, url, target, auth, kwargs)
+        except Exception as e:
+            if recorder is not None:
+                recorder.record(method, url, kwargs.get("json"), None, time.monotonic() - start, start - queued, error=e)
+            raise
+        slot["latency"] = time.monotonic() - start
+        slot["retry_after"] = _retry_after(response)
+        if recorder is not None:
+            # A 304 is recorded with the body it confirmed, so a replay with a cold cache can still answer
+            cached = http_cache.load(cache_key) if cache_key and response.status_code == 304 else None
+            recorder.record(method, url, kwargs.get("json"), response, slot["latency"], start - queued,
+                            cached=cached[1] if cached else None)
+        return response
+
+
+def _refresh_in_background(fn):
+    def run():
+        with session_context("http-cache-refresh", BACKGROUND):
+            fn()
+    threading.Thread(target=run, name="http-cache-refresh", daemon=True).start()
+
+
+def request(method, url, auth=None, priority=None, cache=None, **kwargs):
+    """
+    Every ADO call goes through here so the process-wide scheduler can budget it.
+
+    `cache` (GET only) selects an http_cache policy: REVALIDATE, SWR or IMMUTABLE.
+    With ADO_RECORD / ADO_REPLAY set, what goes over the wire is captured to
+    or answered from an archive (see ado_replay); the cache and scheduler
+    run as usual.
+    """
+    if not cache or method != "GET":
+        return _send(method, url, auth=auth, priority=priority, **kwargs)
+
+    headers = kwargs.pop("headers", None) or {}
+    scope = scheduler.budget_key(auth)
+    key = http_cache.cache_key("GET", url, scope)
+
+    def send(conditional):
+        return _send(method, url, auth=auth, priority=priority, cache_key=key,
+                     headers={**headers, **conditional}, **kwargs)
+
+    return http_cache.fetch(send, url, cache, scope=scope, refresh=_refresh_in_background)
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
@@ -0,0 +1,219 @@
+# ado_replay.py
+
+import os
+import re
+import gzip
+import json
+import time
+import base64
+import atexit
+import threading
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import requests
+
+from http_cache import as_response
+
+FORMAT = "sprintdeck-ado-replay"
+VERSION = 2   # 2: recorded beneath the cache; elapsed is network time, queued is separate
+
+RECORD_PATH = os.environ.get("ADO_RECORD")
+REPLAY_PATH = os.environ.get("ADO_REPLAY")
+REPLAY_TIMING = os.environ.get("ADO_REPLAY_TIMING", "recorded")   # "recorded" | "none"
+
+DROPPED_HEADERS = {"set-cookie", "authorization"}
+
+# WIQL carries "since" dates computed from today; replay on another day must still match
+_DATE = re.compile(r"\d{4}-\d{2}-\d{2}(T[\d:.]+Z?)?")
+
+
+# ==================================================
+# RECORD / REPLAY OF ADO TRAFFIC
+# ==================================================
+# Sits in ado_http._send, inside the scheduler slot and beneath the HTTP
+# cache: what is recorded is each call that actually went over the wire
+# (conditional GETs and their 304s included), with its network time and,
+# separately, the time it queued for a slot. A 304 also carries the cached
+# body it confirmed, so a replay that starts with a cold cache can answer
+# the same call with a 200. An archive is gzip-compressed JSON lines (a
+# header, then one exchange per line), flushed per exchange so a crash loses
+# at most the line being written.
+#
+# Replay answers the wire call from the archive with no network; the
+# scheduler and cache still run, so a replayed run queues, throttles and
+# revalidates like the recorded one, and each call holds its slot for the
+# recorded network time. Exchanges are matched on (method, url, JSON body),
+# with dates in the body masked, so replay on a later day still finds its
+# WIQL. Views that window results by "today" (e.g. resource periods) still
+# move with the calendar. Repeats of the same call are served in recorded
+# order, and the last one is repeated after that. Calls that are not in the
+# archive raise ReplayMiss. Replay writes through the HTTP cache, so point
+# SPRINTDECK_DATA_DIR somewhere disposable.
+# While either mode is on, closed-item histories bypass history_store, so
+# they travel through here as well.
+#
+#   ADO_RECORD=triage.jsonl.gz streamlit run SprintDeck.py
+#   ADO_REPLAY=triage.jsonl.gz streamlit run SprintDeck.py      (offline)
+
+class ReplayMiss(requests.exceptions.ConnectionError):
+    """The replayed session never made this call."""
+
+
+def _key(method, url, body):
+    if body is None:
+        return method, url, ""
+    return method, url, _DATE.sub("<date>", json.dumps(body, sort_keys=True, separators=(",", ":")))
+
+def _encode(content):
+    try:
+        return {"text": content.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"b64": base64.b64encode(content).decode("ascii")}
+
+def _decode(entry):
+    return entry["text"].encode("utf-8") if "text" in entry else base64.b64decode(entry.get("b64", ""))
+
+
+class Recorder:
+    def __init__(self, path):
+        self.path = path
+        self.started = time.monotonic()
+        self.count = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._fh = gzip.open(path, "wt", encoding="utf-8")
+        self._write({"format": FORMAT, "version": VERSION, "recorded_at": datetime.now(timezone.utc).isoformat()})
+
+    def _write(self, obj):
+        self._fh.write(json.dumps(obj, separators=(",", ":")) + "\n")
+        self._fh.flush()
+
+    def record(self, method, url, body, response, elapsed, queued=0.0, error=None, cached=None):
+        entry = {
+            "at": round(time.monotonic() - self.started, 4),
+            "method": method,
+            "url": url,
+            "body": body,
+            "elapsed": round(elapsed, 4),
+            "queued": round(queued, 4),
+        }
+        if error is not None:
+            entry["error"] = f"{type(error).__name__}: {error}"
+        else:
+            entry["status"] = response.status_code
+            entry["headers"] = {k: v for k, v in response.headers.items() if k.lower() not in DROPPED_HEADERS}
+            entry.update(_encode(response.content))
+            if cached is not None:
+                entry["cached"] = _encode(cached)
+        with self._lock:
+            if self._fh is not None:
+                self._write(entry)
+                self.count += 1
+
+    def close(self):
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+
+def read_archive(path):
+    """(header, exchanges) from an archive; a truncated tail (crash while recording) is ignored."""
+    header, exchanges = {}, []
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as fh:
+            for line in fh:
+                obj = json.loads(line)
+                if obj.get("format") == FORMAT:
+                    header = obj
+                else:
+                    exchanges.append(obj)
+    except (EOFError, ValueError):
+        pass
+    return header, exchanges
+
+
+class Replayer:
+    def __init__(self, path, timing=REPLAY_TIMING):
+        self.path = path
+        self.header, exchanges = read_archive(path)
+        if self.header.get("version", VERSION) > VERSION:
+            raise ValueError(f"{path}: archive version {self.header['version']} is newer than this build")
+        self.timing = timing
+        self._queues = defaultdict(list)
+        for e in exchanges:
+            self._queues[_key(e["method"], e["url"], e.get("body"))].append(e)
+        self._served = defaultdict(int)
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(q) for q in self._queues.values())
+
+    def served(self):
+        """Every recorded exchange answered so far (repeats included)."""
+        with self._lock:
+            counts = dict(self._served)
+        return [self._queues[key][min(i, len(self._queues[key]) - 1)] for key, n in counts.items() for i in range(n)]
+
+    def serve(self, method, url, body, conditional=False):
+        key = _key(method, url, body)
+        with self._lock:
+            queue = self._queues.get(key)
+            if not queue:
+                self.misses += 1
+                raise ReplayMiss(f"not in replay archive: {method} {url}")
+            entry = queue[min(self._served[key], len(queue) - 1)]
+            self._served[key] += 1
+        if self.timing == "recorded":
+            time.sleep(entry["elapsed"])
+        if "error" in entry:
+            raise requests.exceptions.ConnectionError(f"replayed failure: {entry['error']}")
+        if entry["status"] == 304 and not conditional and "cached" in entry:
+            # Recorded against a warm cache; this replay has nothing to revalidate
+            return as_response(url, {"status": 200, "headers": entry["headers"]}, _decode(entry["cached"]))
+        return as_response(url, {"status": entry["status"], "headers": entry["headers"]}, _decode(entry))
+
+    def projects(self):
+        """Project names seen in recorded WIQL calls (what a fixture can be replayed against)."""
+        names = set()
+        for method, url, _ in self._queues:
+            if "/_apis/wit/wiql" in url:
+                parts = url.split("/_apis/")[0].rstrip("/").split("/")
+                names.add(requests.utils.unquote(parts[-1]))
+        return sorted(names)
+
+
+# ==================================================
+# PROCESS-WIDE MODE
+# ==================================================
+recorder = None
+replayer = None
+
+def start_recording(path):
+    global recorder
+    stop_recording()
+    recorder = Recorder(path)
+    return recorder
+
+def stop_recording():
+    global recorder
+    if recorder is not None:
+        recorder.close()
+        recorder = None
+
+def start_replay(path, timing=REPLAY_TIMING):
+    global replayer
+    replayer = Replayer(path, timing)
+    return replayer
+
+def active():
+    return recorder is not None or replayer is not None
+
+atexit.register(stop_recording)
+
+if REPLAY_PATH:
+    start_replay(REPLAY_PATH)
+elif RECORD_PATH:
+    start_recording(RECORD_PATH)
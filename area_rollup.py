@@ -0,0 +1,96 @@
+# area_rollup.py
+
+from collections import defaultdict
+
+AREA_SEP = "\\"
+
+
+# ==================================================
+# AREA TREE NODE
+# ==================================================
+class AreaNode:
+    __slots__ = ("path", "name", "depth", "parent", "children", "own", "total")
+
+    def __init__(self, path, parent=None):
+        self.path = path
+        self.name = path.split(AREA_SEP)[-1]
+        self.depth = path.count(AREA_SEP)
+        self.parent = parent
+        self.children = []
+        self.own = defaultdict(int)    # stats recorded directly on this area
+        self.total = {}                # own + every descendant (filled by rollup)
+
+
+# ==================================================
+# PREFIX-TREE AGGREGATOR
+# ==================================================
+class AreaRollup:
+    """
+    Prefix tree over area paths with per-node subtree totals.
+
+    Leaf stats are plain {key: number} dicts. Totals for every node are
+    computed in one bottom-up pass, so reading any subtree is a dict lookup.
+    """
+
+    def __init__(self, leaf_stats=None):
+        self._nodes = {}
+        self.roots = []
+        for path, stats in (leaf_stats or {}).items():
+            self.add(path, stats)
+        self.rollup()
+
+    def _node(self, path):
+        node = self._nodes.get(path)
+        if node is not None:
+            return node
+
+        parent_path = path.rsplit(AREA_SEP, 1)[0] if AREA_SEP in path else None
+        parent = self._node(parent_path) if parent_path else None
+        node = AreaNode(path, parent)
+        self._nodes[path] = node
+        if parent is None:
+            self.roots.append(node)
+        else:
+            parent.children.append(node)
+        return node
+
+    def add(self, path, stats):
+        node = self._node(path or "Unassigned")
+        for key, value in stats.items():
+            node.own[key] += value
+
+    def rollup(self):
+        # Deepest nodes first, so every child total is final before its parent reads it
+        for node in sorted(self._nodes.values(), key=lambda n: n.depth, reverse=True):
+            node.total = dict(node.own)
+            for child in node.children:
+                for key, value in child.total.items():
+                    node.total[key] = node.total.get(key, 0) + value
+        return self
+
+    # ---------- READERS ----------
+    def __contains__(self, path):
+        return path in self._nodes
+
+    def get(self, path):
+        node = self._nodes.get(path)
+        return node.total if node else {}
+
+    def node(self, path):
+        return self._nodes.get(path)
+
+    def children(self, path):
+        node = self._nodes.get(path)
+        return sorted(node.children, key=lambda n: n.name.lower()) if node else []
+
+    def walk(self, path=None):
+        """Yield nodes depth-first in display order, starting at `path` (or every root)."""
+        start = [self._nodes[path]] if path in self._nodes else sorted(self.roots, key=lambda n: n.name.lower())
+        stack = list(reversed(start))
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(sorted(node.children, key=lambda n: n.name.lower())))
+
+    def paths(self):
+        return [n.path for n in self.walk()]
@@ -0,0 +1,176 @@
+# attribution_index.py
+
+import numpy as np
+import pandas as pd
+
+from identities import identities, NOBODY
+from revision_history import STATE, ASSIGNED_TO, CHANGED_DATE
+from config import STORY_TYPES, CLOSED_STATES
+
+ITEM_COLUMNS = ["ID", "Type", "State", "StoryPoints", "Title"]
+MATRIX_COLUMNS = ["Resource", "Stories", "Bugs", "TestCases", "StoryPoints", "Total Work Items"]
+
+
+# ==================================================
+# ATTRIBUTION EVENTS
+# ==================================================
+# An event (user, timestamp, until, item) says "user held this item from
+# timestamp until the next revision": one per revision from the item's
+# history (the assignee on that revision). A holding ends when the item is
+# closed: the revision that closes it is a point event (the closer is
+# credited in the range where it closed), revisions while it stays closed
+# add nothing, and only the last revision of an open item is open-ended.
+# Test Cases (no history fetched) get one point event at ChangedDate for
+# the current assignee. A user is in a range when one of their holdings
+# overlaps it, so an owner whose assignment spans the whole range with no
+# revision inside it still counts. Any date range is one vectorized overlap
+# test over the event arrays instead of a new API pass. Users are identity
+# ids; names are resolved only for the users a matrix shows.
+
+class AttributionBuilder:
+    """Accumulates items and events page by page; `build()` freezes them into an index."""
+
+    def __init__(self):
+        self.item_rows = []
+        self.closed_at = []
+        self.users = {}
+        self.ev_user, self.ev_ts, self.ev_until, self.ev_item = [], [], [], []
+
+    def _user(self, uid):
+        return self.users.setdefault(uid, len(self.users))
+
+    def add_item(self, item, closed_at=None):
+        self.item_rows.append((item["id"], item["type"], item["state"], item["story_points"], item.get("title") or ""))
+        self.closed_at.append(closed_at)
+        return len(self.item_rows) - 1
+
+    def _event(self, user, ts, until, idx):
+        self.ev_user.append(self._user(user))
+        self.ev_ts.append(ts)
+        self.ev_until.append(until)
+        self.ev_item.append(idx)
+
+    def add_history(self, item, revisions):
+        stamps, closed_at, was_closed = [], None, False
+        for i, r in enumerate(revisions):
+            closed = r[STATE] in CLOSED_STATES
+            if closed and was_closed:
+                continue
+            was_closed = closed
+            closed_at = r[CHANGED_DATE] if closed else None
+            until = r[CHANGED_DATE] if closed else (revisions[i + 1][CHANGED_DATE] if i + 1 < len(revisions) else None)
+            if r[ASSIGNED_TO] and r[CHANGED_DATE]:
+                stamps.append((r[ASSIGNED_TO], r[CHANGED_DATE], until))
+        if not stamps:
+            return
+        idx = self.add_item(item, closed_at)
+        for user, ts, until in stamps:
+            self._event(user, ts, until, idx)
+
+    def add_current(self, item):
+        if item.assigned_id == NOBODY or not item.changed_date:
+            return
+        idx = self.add_item(item, item.changed_date if item.state in CLOSED_STATES else None)
+        self._event(item.assigned_id, item.changed_date, item.changed_date, idx)
+
+    def build(self, flow_df=None):
+        return AttributionIndex(
+            self.item_rows, list(self.users), self.ev_user, self.ev_ts, self.ev_until, self.ev_item,
+            flow_df, self.closed_at
+        )
+
+
+def _epoch_ns(stamps, missing):
+    parsed = pd.to_datetime(pd.Series(stamps, dtype=object), utc=True, format="ISO8601")
+    return np.where(parsed.isna(), missing, parsed.to_numpy("datetime64[ns]").astype(np.int64))
+
+
+class AttributionIndex:
+    def __init__(self, item_rows, users, ev_user, ev_ts, ev_until, ev_item, flow_df=None, closed_at=None):
+        items = pd.DataFrame(item_rows, columns=ITEM_COLUMNS)
+        for col in ["Type", "State"]:
+            items[col] = items[col].astype("category")
+        self.items = items
+        self.users = np.asarray(users, dtype=np.int32)   # dense user -> identity id
+        self.flow = flow_df if flow_df is not None else pd.DataFrame()
+
+        never = np.iinfo(np.int64).max
+        ts = _epoch_ns(ev_ts, 0)
+        until = _epoch_ns(ev_until, never)   # still held: open-ended
+        # When each item was last closed (never, if it is open); see check_closed
+        self.closed_at = _epoch_ns(closed_at if closed_at is not None else [None] * len(items), never)
+        self.ev_user, self.ev_ts, self.ev_until = np.asarray(ev_user, dtype=np.int32), ts, until
+        self.ev_item = np.asarray(ev_item, dtype=np.int32)
+
+        is_story = items["Type"].isin(STORY_TYPES).to_numpy()
+        self._story = is_story.astype(np.int64)
+        self._bug = (items["Type"] == "Bug").to_numpy().astype(np.int64)
+        self._test = (items["Type"] == "Test Case").to_numpy().astype(np.int64)
+        self._points = np.where(is_story, pd.to_numeric(items["StoryPoints"], errors="coerce").fillna(0).to_numpy(), 0)
+
+    def _pairs(self, start, end):
+        """Unique (user, item) pairs with a holding that overlaps [start, end), grouped by user."""
+        lo_t, hi_t = pd.Timestamp(start, tz="UTC").value, pd.Timestamp(end, tz="UTC").value
+        # A holding overlaps the range, or a point event (closing revision, Test Case) falls inside it
+        hit = (self.ev_ts < hi_t) & ((self.ev_until > lo_t) | (self.ev_ts >= lo_t))
+        if not hit.any():
+            return np.empty(0, np.int32), np.empty(0, np.int32)
+        n_items = max(len(self.items), 1)
+        pairs = np.unique(self.ev_user[hit].astype(np.int64) * n_items + self.ev_item[hit])
+        return (pairs // n_items).astype(np.int32), (pairs % n_items).astype(np.int32)
+
+    def matrix(self, start, end):
+        """(matrix df, compact summary, flow df) for the range."""
+        users, items = self._pairs(start, end)
+        if not len(users):
+            return pd.DataFrame(columns=MATRIX_COLUMNS), {"items": self.items.iloc[:0], "users": {}}, self.flow.iloc[:0]
+
+        n = len(self.users)
+        counts = {
+            "Stories": np.bincount(users, self._story[items], n).astype(np.int64),
+            "Bugs": np.bincount(users, self._bug[items], n).astype(np.int64),
+            "TestCases": np.bincount(users, self._test[items], n).astype(np.int64),
+            "StoryPoints": np.bincount(users, self._points[items], n),
+        }
+        active = np.unique(users)
+        # Rows are indexed by identity id: two people sharing a display name stay two rows
+        df = pd.DataFrame(
+            {"Resource": identities.names(self.users[active]), **{k: v[active] for k, v in counts.items()}},
+            index=pd.Index(self.users[active].astype(int), name="uid")
+        )
+        df["Total Work Items"] = df["Stories"] + df["Bugs"] + df["TestCases"]
+        df = df.sort_values(["StoryPoints", "Total Work Items"], ascending=False)
+
+        # pairs come out grouped by user, so each user's rows are one contiguous run
+        bounds = np.searchsorted(users, np.arange(n + 1))
+        summary_users = {
+            int(self.users[u]): {
+                "Stories": int(counts["Stories"][u]),
+                "Bugs": int(counts["Bugs"][u]),
+                "TestCases": int(counts["TestCases"][u]),
+                "StoryPoints": counts["StoryPoints"][u],
+                "ItemIdx": items[bounds[u]:bounds[u + 1]],
+            }
+            for u in active
+        }
+
+        flow = self.flow
+        if not flow.empty:
+            flow = flow[flow["id"].isin(self.items["ID"].to_numpy()[items])].reset_index(drop=True)
+        return df, {"items": self.items, "users": summary_users}, flow
+
+    def check_closed(self, start, summary):
+        """Items in `summary` (a matrix() result) that closed before `start`; should always be empty."""
+        idx = np.unique(np.concatenate([u["ItemIdx"] for u in summary["users"].values()] or [np.empty(0, np.int32)]))
+        stale = idx[self.closed_at[idx] < pd.Timestamp(start, tz="UTC").value]
+        return self.items["ID"].to_numpy()[stale].tolist()
+
+    def compare(self, current, previous):
+        """Per-resource deltas between two (start, end) ranges."""
+        cur, prev = self.matrix(*current)[0], self.matrix(*previous)[0]
+        metrics = ["Stories", "Bugs", "TestCases", "StoryPoints", "Total Work Items"]
+        both = cur[metrics].join(prev[metrics], how="outer", lsuffix="", rsuffix=" (prev)").fillna(0)
+        for m in metrics:
+            both[f"Δ {m}"] = both[m] - both[f"{m} (prev)"]
+        both.insert(0, "Resource", identities.names(both.index))
+        return both.sort_values("Δ StoryPoints", ascending=False).reset_index(drop=True)
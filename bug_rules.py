@@ -0,0 +1,135 @@
+# bug_rules.py
+
+import os
+import json
+import threading
+import numpy as np
+import pandas as pd
+from config import RULES_DIR, DEFAULT_RULES, CLOSED_STATES, safe_name
+
+_cache = {}
+_lock = threading.Lock()
+
+
+# ==================================================
+# CONDITION COMPILER
+# ==================================================
+# A condition is either {"any": [...]}, {"all": [...]}, {"not": {...}} or a
+# leaf {"field": <ADO field>, <op>: <value>}. Leaves compile to functions of
+# the work-item frame that return a boolean Series, so a whole rule set is
+# evaluated column-wise over every bug at once.
+
+def _text(df, field):
+    if field not in df:
+        return pd.Series("", index=df.index, dtype=object)
+    return df[field].astype(object).fillna("").astype(str)
+
+def _number(df, field):
+    if field not in df:
+        return pd.Series(np.nan, index=df.index)
+    return pd.to_numeric(df[field], errors="coerce")
+
+_LEAF_OPS = {
+    "eq": lambda df, f, v: _text(df, f) == str(v),
+    "ne": lambda df, f, v: _text(df, f) != str(v),
+    "in": lambda df, f, v: _text(df, f).isin([str(x) for x in v]),
+    "not_in": lambda df, f, v: ~_text(df, f).isin([str(x) for x in v]),
+    "startswith": lambda df, f, v: _text(df, f).str.startswith(str(v)),
+    "contains": lambda df, f, v: _text(df, f).str.contains(str(v), regex=False),
+    "empty": lambda df, f, v: (_text(df, f) == "") == bool(v),
+    "gt": lambda df, f, v: _number(df, f) > v,
+    "lt": lambda df, f, v: _number(df, f) < v,
+}
+
+def compile_condition(cond):
+    if "any" in cond:
+        parts = [compile_condition(c) for c in cond["any"]]
+        return lambda df: np.logical_or.reduce([p(df) for p in parts]) if parts else np.zeros(len(df), bool)
+    if "all" in cond:
+        parts = [compile_condition(c) for c in cond["all"]]
+        return lambda df: np.logical_and.reduce([p(df) for p in parts]) if parts else np.ones(len(df), bool)
+    if "not" in cond:
+        inner = compile_condition(cond["not"])
+        return lambda df: ~np.asarray(inner(df), dtype=bool)
+
+    field = cond["field"]
+    ops = [k for k in cond if k in _LEAF_OPS]
+    if len(ops) != 1:
+        raise ValueError(f"Rule on {field} needs exactly one of {sorted(_LEAF_OPS)}")
+    op, value = ops[0], cond[ops[0]]
+    return lambda df: np.asarray(_LEAF_OPS[op](df, field, value), dtype=bool)
+
+def _fields(cond):
+    for key in ("any", "all"):
+        if key in cond:
+            return set().union(*(_fields(c) for c in cond[key])) if cond[key] else set()
+    if "not" in cond:
+        return _fields(cond["not"])
+    return {cond["field"]}
+
+
+# ==================================================
+# RULE SET
+# ==================================================
+class RuleSet:
+    """Compiled classification rules for one project."""
+
+    def __init__(self, spec, source=None):
+        self.source = source
+        self.closed_states = list(spec.get("closed_states", sorted(CLOSED_STATES)))
+        self.escape = spec.get("escape", {})
+        self.fields = set()
+        self._classifiers = {}
+        for name, c in spec.get("classifications", {}).items():
+            rules = [(r["label"], compile_condition(r["when"])) for r in c.get("rules", [])]
+            for r in c.get("rules", []):
+                self.fields |= _fields(r["when"])
+            self._classifiers[name] = (rules, c.get("default", "Other"))
+
+    @property
+    def classifications(self):
+        return list(self._classifiers)
+
+    def classify(self, name, df):
+        """Label every row of `df` for classification `name` (first matching rule wins)."""
+        rules, default = self._classifiers[name]
+        if df.empty:
+            return pd.Series([], index=df.index, dtype=object)
+        if not rules:
+            return pd.Series(default, index=df.index, dtype=object)
+        labels = np.select([cond(df) for _, cond in rules], [label for label, _ in rules], default=default)
+        return pd.Series(labels, index=df.index, dtype=object)
+
+    def is_closed(self, states):
+        return states.isin(self.closed_states)
+
+    def is_escape(self, df):
+        name, labels = self.escape.get("classification"), self.escape.get("labels", [])
+        if not name or name not in self._classifiers:
+            return pd.Series(False, index=df.index)
+        return self.classify(name, df).isin(labels)
+
+
+# ==================================================
+# LOADING (compiled once per file version)
+# ==================================================
+def _rules_path(project):
+    if project:
+        path = os.path.join(RULES_DIR, f"{safe_name(project)}.json")
+        if os.path.exists(path):
+            return path
+    return os.path.join(RULES_DIR, DEFAULT_RULES)
+
+def load_rules(project=None):
+    """Rules for `project` (rules/<project>.json, else rules/default.json); recompiled only when the file changes."""
+    path = _rules_path(project)
+    mtime = os.path.getmtime(path)
+    with _lock:
+        hit = _cache.get(path)
+        if hit and hit[0] == mtime:
+            return hit[1]
+    with open(path, encoding="utf-8") as fh:
+        ruleset = RuleSet(json.load(fh), source=path)
+    with _lock:
+        _cache[path] = (mtime, ruleset)
+    return ruleset
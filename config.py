@@ -0,0 +1,34 @@
+# config.py
+
+import os
+import json
+
+DATA_DIR = os.environ.get("SPRINTDECK_DATA_DIR", ".sprintdeck")
+RULES_DIR = os.environ.get("SPRINTDECK_RULES_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules"))
+DEFAULT_RULES = "default.json"
+
+STORY_TYPES = ["User Story", "Requirement", "Product Backlog Item"]
+
+
+# ==================================================
+# CLOSED STATES
+# ==================================================
+# Taken from rules/default.json, the file the governance report classifies
+# with, so the dashboards and the rules cannot disagree about what "closed"
+# means. A project rule file can still override it for that project's
+# governance report (bug_rules.load_rules).
+
+def _default_closed_states():
+    try:
+        with open(os.path.join(RULES_DIR, DEFAULT_RULES), encoding="utf-8") as fh:
+            states = json.load(fh).get("closed_states")
+    except (OSError, ValueError):
+        states = None
+    return frozenset(states or ["Closed", "Resolved", "Done", "Completed"])
+
+CLOSED_STATES = _default_closed_states()
+
+
+def safe_name(name):
+    """`name` reduced to characters that are safe in a file name."""
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in name)
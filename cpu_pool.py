@@ -0,0 +1,59 @@
+# cpu_pool.py
+
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+MAX_WORKERS = int(os.environ.get("SPRINTDECK_CPU_WORKERS", max(1, min(4, (os.cpu_count() or 2) - 1))))
+# Below this many rows the pickling round trip costs more than it saves
+OFFLOAD_MIN_ROWS = int(os.environ.get("SPRINTDECK_OFFLOAD_MIN_ROWS", 500))
+
+_pool = None
+_lock = threading.Lock()
+
+
+# ==================================================
+# SHARED WORKER PROCESS POOL
+# ==================================================
+# One pool per server process, shared by every session. Workers are spawned
+# (not forked) because the Streamlit server is multi-threaded. Anything sent
+# here must be a top-level function in an importable module, with picklable
+# arguments and results.
+
+def _get_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=MAX_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+def _reset_pool():
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+def run(fn, *args, rows=None, **kwargs):
+    """
+    Run `fn(*args, **kwargs)` in the worker pool and wait for the result.
+
+    Small jobs (`rows` below OFFLOAD_MIN_ROWS) and pool failures fall back to
+    running inline, so callers always get an answer.
+    """
+    if MAX_WORKERS < 1 or (rows is not None and rows < OFFLOAD_MIN_ROWS):
+        return fn(*args, **kwargs)
+    try:
+        return _get_pool().submit(fn, *args, **kwargs).result()
+    except BrokenProcessPool:
+        _reset_pool()
+        return fn(*args, **kwargs)
+
+def deferred(fn, *args, rows=None, **kwargs):
+    """A zero-arg `run(fn, ...)` for st.download_button: the work happens on click, not on every rerun."""
+    return lambda: run(fn, *args, rows=rows, **kwargs)
@@ -0,0 +1,67 @@
+import ado_http
+import urllib.parse
+from fanout import fan_out, Incomplete
+from revision_history import STATE, ASSIGNED_TO
+from revision_repository import revisions
+from identities import identities
+from work_items import parse_work_item
+from hierarchy import build_hierarchy
+from config import STORY_TYPES, CLOSED_STATES
+
+HEADERS = {"Content-Type": "application/json"}
+
+
+def fetch_details(org, ids, auth):
+    wi_map = {}
+    if not ids: return wi_map
+    # Sorted, not set order: the same ids must give the same batch URLs (cache keys, replay)
+    ids = [str(i) for i in sorted({int(i) for i in ids})]
+    for i in range(0, len(ids), 200):
+        batch = ids[i:i+200]
+        url = f"https://dev.azure.com/{org}/_apis/wit/workitems?ids={','.join(batch)}&$expand=relations&api-version=7.0"
+        r = ado_http.get(url, auth=auth)
+        if r.status_code == 200:
+            for item in map(parse_work_item, r.json().get("value", [])):
+                wi_map[item.id] = item
+    return wi_map
+
+
+def history_key(item):
+    """(closed, rev) for revision lookups: closed items at an unchanged Rev are never re-fetched."""
+    return item["state"] in CLOSED_STATES, item.get("rev")
+
+
+UNAVAILABLE = "⚠️ Unavailable"
+
+
+def developer_when_in_progress(org, project, work_item_id, auth, closed=False, rev=None):
+    for r in revisions.get(org, project, work_item_id, auth, closed=closed, rev=rev):
+        if r[STATE] in ["In Progress", "Active"]:
+            return identities.name(r[ASSIGNED_TO], "Unknown")
+    return "Not Found"
+
+
+def load_delivery_data(org, project, path_filter, auth):
+    """
+    WIQL + work item details + in-progress developer per story + parent chain;
+    None if the query fails. Raises Incomplete (carrying the same tuple) when
+    some story histories could not be loaded after the deferred retries.
+    """
+    query = f"SELECT [System.Id] FROM WorkItems WHERE {path_filter}"
+    api_url = f"https://dev.azure.com/{org}/{urllib.parse.quote(project)}/_apis/wit/wiql?api-version=7.0"
+    r = ado_http.post(api_url, json={"query": query}, auth=auth, headers=HEADERS)
+    if r.status_code != 200:
+        return None
+
+    sprint_ids = [wi['id'] for wi in r.json().get('workItems', [])]
+    data_map = fetch_details(org, sprint_ids, auth)
+    story_ids = [sid for sid, i in data_map.items() if i["type"] in STORY_TYPES]
+
+    devs = fan_out(lambda sid: developer_when_in_progress(org, project, sid, auth, *history_key(data_map[sid])), story_ids)
+    dev_results = {**dict.fromkeys(devs.failed, UNAVAILABLE), **devs.results}
+
+    # Features/Epics outside the filter are pulled in bulk, one call per hierarchy level
+    hierarchy = build_hierarchy(data_map, lambda ids: fetch_details(org, ids, auth))
+    if devs.failed:
+        raise Incomplete((data_map, dev_results, hierarchy), devs.failed, "story histories")
+    return data_map, dev_results, hierarchy
@@ -0,0 +1,80 @@
+# export_utils.py
+
+import io
+import os
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from work_items import WorkItemBatch
+
+CHUNK_ROWS = 50_000
+EXPORT_DIR = os.environ.get("SPRINTDECK_EXPORT_DIR")
+
+PARQUET_MIME = "application/vnd.apache.parquet"
+CSV_MIME = "text/csv"
+
+WORK_ITEM_COLUMNS = ["id", "type", "state", "title", "assigned_to", "created_by", "area_path", "story_points"]
+
+
+# ==================================================
+# COLUMNAR FRAMES
+# ==================================================
+def work_items_frame(data_map, columns=WORK_ITEM_COLUMNS):
+    """Flat, typed frame of the loaded work items (no HTML, no per-row formatting)."""
+    return WorkItemBatch.from_items(data_map.values()).frame(columns)
+
+
+# ==================================================
+# STREAMING WRITERS
+# ==================================================
+def _batches(df, chunk_rows):
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+def write_parquet(df, sink, chunk_rows=CHUNK_ROWS):
+    """Write `df` as Parquet one row group at a time, so only one chunk is converted at once."""
+    if df.empty:
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), sink)
+        return
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for chunk in _batches(df, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+def write_csv(df, sink, chunk_rows=CHUNK_ROWS):
+    """Stream `df` as UTF-8 CSV in chunks into a binary sink."""
+    for n, chunk in enumerate(_batches(df, chunk_rows)):
+        sink.write(chunk.to_csv(index=False, header=(n == 0)).encode("utf-8"))
+    if df.empty:
+        sink.write(df.to_csv(index=False).encode("utf-8"))
+
+
+# ==================================================
+# DOWNLOAD PAYLOADS
+# ==================================================
+# st.download_button takes bytes or a zero-argument callable; these return the
+# callable, so the file is only encoded when the user actually clicks.
+
+def _deferred(writer, df):
+    def build():
+        buf = io.BytesIO()
+        writer(df, buf)
+        return buf.getvalue()
+    return build
+
+def parquet_download(df):
+    return _deferred(write_parquet, df)
+
+def csv_download(df):
+    return _deferred(write_csv, df)
+
+def save_export(df, name):
+    """Drop a Parquet file into SPRINTDECK_EXPORT_DIR for BI jobs; returns the path (None if unset)."""
+    if not EXPORT_DIR:
+        return None
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    path = os.path.join(EXPORT_DIR, f"{name}.parquet")
+    tmp = path + ".tmp"
+    write_parquet(df, tmp)
+    os.replace(tmp, path)
+    return path
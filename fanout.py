@@ -0,0 +1,85 @@
+# fanout.py
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from request_scheduler import bind, scheduler
+
+# Threads only wait on the scheduler; the per-PAT adaptive limit decides how
+# many calls are actually on the wire, so the pool is as wide as its ceiling.
+WORKERS = scheduler.max_in_flight
+RETRY_ROUNDS = int(os.environ.get("ADO_FANOUT_RETRIES", 2))
+RETRY_DELAY = float(os.environ.get("ADO_FANOUT_RETRY_DELAY", 1.0))
+
+
+class FanOut:
+    """Per-key results plus the keys that still failed after every retry round (key -> exception)."""
+
+    __slots__ = ("results", "failed")
+
+    def __init__(self, results, failed):
+        self.results, self.failed = results, failed
+
+    def __bool__(self):
+        return not self.failed
+
+
+class Incomplete(Exception):
+    """
+    A pipeline finished with some inputs missing. Raised (rather than
+    returned) so st.cache_data does not keep the partial answer; `value` is
+    still usable and `failed` says what it lacks.
+    """
+
+    def __init__(self, value, failed, what="items"):
+        super().__init__(f"{len(failed)} {what} could not be loaded")
+        self.value, self.failed, self.what = value, failed, what
+
+
+def retryable(error):
+    """Throttling, server errors and transport failures may pass on a later round; other errors will not."""
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+def fan_out(fn, keys, retries=RETRY_ROUNDS, workers=WORKERS):
+    """
+    Run fn(key) for every key in parallel. A key whose call raises a
+    retryable error is not retried in place (holding a worker through the
+    backoff); it is deferred to a later round that runs after the whole
+    pass, with the delay doubling each round. Anything else (a 401, a 404)
+    fails at once. Failures are reported, never turned into empty results.
+    """
+    keys = list(dict.fromkeys(keys))
+    results, failed = {}, {}
+    call = bind(fn)
+
+    def attempt(key):
+        try:
+            return key, call(key), None
+        except Exception as e:
+            return key, None, e
+
+    pending = keys
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(keys) or 1))) as executor:
+        for round_no in range(retries + 1):
+            if round_no:
+                time.sleep(RETRY_DELAY * 2 ** (round_no - 1))
+            deferred = {}
+            for key, value, error in executor.map(attempt, pending):
+                if error is None:
+                    results[key] = value
+                elif retryable(error):
+                    deferred[key] = error
+                else:
+                    failed[key] = error
+            pending = list(deferred)
+            if not pending:
+                break
+    failed.update(deferred)
+    return FanOut(results, failed)
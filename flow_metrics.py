@@ -0,0 +1,140 @@
+# flow_metrics.py
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+from revision_history import STATE, CHANGED_DATE
+from config import CLOSED_STATES
+
+ACTIVE_STATES = {"Active", "In Progress", "Committed"}
+PERCENTILES = (50, 70, 85, 95)
+
+TRANSITION_COLUMNS = ["id", "state", "start", "end", "hours"]
+
+
+# ==================================================
+# TRANSITIONS TABLE
+# ==================================================
+def build_transitions(history_map, now=None):
+    """
+    Turn {work_item_id: compact revisions} into a columnar state-interval table.
+
+    One row per state an item entered; `end` is the next transition (or `now`
+    for the current state). Everything after the flattening step is vectorized.
+    """
+    ids, states, stamps = [], [], []
+    for wi_id, revisions in history_map.items():
+        for rev in revisions or ():
+            if rev[STATE] and rev[CHANGED_DATE]:
+                ids.append(wi_id)
+                states.append(rev[STATE])
+                stamps.append(rev[CHANGED_DATE])
+
+    if not ids:
+        return pd.DataFrame(columns=TRANSITION_COLUMNS)
+
+    now = pd.Timestamp(now or pd.Timestamp.now(tz="UTC"))
+    df = pd.DataFrame({
+        "id": np.asarray(ids, dtype=np.int64),
+        "state": pd.Categorical(states),
+        "start": pd.to_datetime(stamps, utc=True, format="ISO8601"),
+    }).sort_values(["id", "start"], kind="stable")
+
+    # Drop revisions that did not change state
+    same_item = df["id"].eq(df["id"].shift())
+    df = df[~(same_item & df["state"].eq(df["state"].shift()))]
+
+    # Interval end = start of the item's next transition, or now for the open one
+    next_same = df["id"].eq(df["id"].shift(-1))
+    df = df.assign(end=df["start"].shift(-1).where(next_same, now))
+    df["hours"] = (df["end"] - df["start"]).dt.total_seconds() / 3600.0
+    return df.reset_index(drop=True)[TRANSITION_COLUMNS]
+
+
+# ==================================================
+# PER-ITEM FLOW METRICS
+# ==================================================
+def item_flow(transitions):
+    """Lead time and cycle time (days) per item; open items have NaN for both."""
+    if transitions.empty:
+        return pd.DataFrame(columns=["id", "created", "started", "finished", "lead_days", "cycle_days"])
+
+    t = transitions
+    is_active = t["state"].isin(ACTIVE_STATES).to_numpy()
+    is_closed = t["state"].isin(CLOSED_STATES).to_numpy()
+    is_last = ~t["id"].eq(t["id"].shift(-1)).to_numpy()
+
+    g = pd.DataFrame({
+        "id": t["id"],
+        "created": t["start"],
+        "started": t["start"].where(is_active),
+        "finished": t["start"].where(is_closed & is_last),
+    }).groupby("id", sort=False).agg(created=("created", "min"), started=("started", "min"), finished=("finished", "max"))
+
+    day = pd.Timedelta(days=1)
+    g["lead_days"] = (g["finished"] - g["created"]) / day
+    g["cycle_days"] = (g["finished"] - g["started"].fillna(g["created"])) / day
+    return g.reset_index()
+
+
+def time_in_state(transitions):
+    """
+    Total hours spent in each state, summed across items. An item's final
+    closed state is where it ended up, not time spent working, so that
+    interval (which runs up to now) is left out; a close that was later
+    reopened still counts.
+    """
+    if transitions.empty:
+        return pd.DataFrame(columns=["state", "hours", "items"])
+    is_last = ~transitions["id"].eq(transitions["id"].shift(-1))
+    terminal = is_last & transitions["state"].isin(CLOSED_STATES)
+    return (
+        transitions[~terminal].groupby("state", observed=True)
+        .agg(hours=("hours", "sum"), items=("id", "nunique"))
+        .reset_index()
+        .sort_values("hours", ascending=False)
+    )
+
+
+def wip_by_day(transitions, states=ACTIVE_STATES):
+    """Items in `states` at the start of each day, via sorted interval endpoints."""
+    t = transitions[transitions["state"].isin(states)] if not transitions.empty else transitions
+    if t.empty:
+        return pd.DataFrame(columns=["day", "wip"])
+
+    starts = np.sort(t["start"].to_numpy(dtype="datetime64[ns]"))
+    ends = np.sort(t["end"].to_numpy(dtype="datetime64[ns]"))
+    days = pd.date_range(
+        t["start"].min().normalize(), t["end"].max().normalize(), freq="D"
+    ).to_numpy(dtype="datetime64[ns]")
+
+    wip = np.searchsorted(starts, days, side="right") - np.searchsorted(ends, days, side="right")
+    return pd.DataFrame({"day": days, "wip": wip})
+
+
+def flow_percentiles(flow, columns=("cycle_days", "lead_days"), percentiles=PERCENTILES):
+    rows = []
+    for col in columns:
+        values = flow[col].dropna().to_numpy(dtype=float) if col in flow else np.array([])
+        if not len(values):
+            continue
+        for p, v in zip(percentiles, np.percentile(values, percentiles)):
+            rows.append({"Metric": col.replace("_days", "").title() + " Time", "Percentile": f"P{p}", "Days": round(float(v), 1)})
+    return pd.DataFrame(rows)
+
+
+# ==================================================
+# CHARTS
+# ==================================================
+def flow_percentile_chart(flow, title="Flow Time Percentiles"):
+    pct = flow_percentiles(flow)
+    if pct.empty:
+        return None
+    return px.bar(pct, x="Percentile", y="Days", color="Metric", barmode="group", text="Days", title=title)
+
+
+def wip_chart(transitions, title="Work In Progress by Day"):
+    wip = wip_by_day(transitions)
+    if wip.empty:
+        return None
+    return px.area(wip, x="day", y="wip", title=title)
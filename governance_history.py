@@ -0,0 +1,106 @@
+# governance_history.py
+
+import os
+import threading
+import pandas as pd
+import pyarrow.parquet as pq
+from datetime import datetime, timedelta
+
+from export_utils import write_parquet
+from config import DATA_DIR, safe_name
+
+HISTORY_DIR = os.path.join(DATA_DIR, "governance")
+
+KEY_COLUMNS = ["Date", "Lookback", "Full Area Path"]
+METRIC_COLUMNS = [
+    "Total Stories", "Closed Stories", "Velocity (Points)", "SIT Bugs", "UAT Bugs",
+    "Bugs Found", "Escape Rate %", "Health Score"
+]
+HISTORY_COLUMNS = KEY_COLUMNS + ["Squad Name"] + METRIC_COLUMNS
+DELTA_METRICS = ["Health Score", "Escape Rate %", "Velocity (Points)"]
+
+_lock = threading.Lock()
+
+
+# ==================================================
+# COLUMNAR SNAPSHOT HISTORY (one Parquet file per project)
+# ==================================================
+# One row per (day, lookback window, squad); a re-run on the same day
+# replaces that day's rows. Rows are kept sorted by Date so range reads
+# skip whole row groups from the Parquet statistics. Dates are local
+# calendar days from today(), the same clock the views filter with.
+
+def today():
+    return datetime.now().date()
+
+def _history_file(project):
+    return os.path.join(HISTORY_DIR, f"{safe_name(project)}.parquet")
+
+def _typed(df):
+    df = df.copy()
+    df["Date"] = pd.to_datetime(df["Date"]).dt.date
+    df["Lookback"] = df["Lookback"].astype("int32")
+    for c in ("Full Area Path", "Squad Name"):
+        df[c] = df[c].astype("category")
+    return df
+
+def record_snapshot(project, report_df, lookback, day=None):
+    """Store today's (or `day`'s) governance rows for `project`."""
+    if report_df.empty:
+        return
+    day = day or today()
+    snap = report_df.reindex(columns=["Squad Name", "Full Area Path"] + METRIC_COLUMNS).assign(Date=day, Lookback=int(lookback))
+
+    with _lock:
+        path = _history_file(project)
+        history = load_history(project)
+        if not history.empty:
+            history = history[~((history["Date"] == day) & (history["Lookback"] == int(lookback)))]
+            snap = pd.concat([history.astype({c: object for c in ("Full Area Path", "Squad Name")}), snap], ignore_index=True)
+        snap = _typed(snap[HISTORY_COLUMNS]).sort_values(KEY_COLUMNS).reset_index(drop=True)
+
+        os.makedirs(HISTORY_DIR, exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        write_parquet(snap, tmp, chunk_rows=10_000)
+        os.replace(tmp, path)
+
+def load_history(project, start=None, end=None, lookback=None):
+    """Snapshot rows with start <= Date <= end (dates), optionally for one lookback window."""
+    path = _history_file(project)
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=HISTORY_COLUMNS)
+    filters = []
+    if start is not None: filters.append(("Date", ">=", start))
+    if end is not None: filters.append(("Date", "<=", end))
+    if lookback is not None: filters.append(("Lookback", "==", int(lookback)))
+    try:
+        return pq.read_table(path, filters=filters or None).to_pandas()
+    except (OSError, ValueError):
+        return pd.DataFrame(columns=HISTORY_COLUMNS)
+
+
+# ==================================================
+# TRENDS & DELTAS
+# ==================================================
+def health_trend(history):
+    """Date x area path Health Score table for charting (squads sharing a leaf name stay apart)."""
+    if history.empty:
+        return pd.DataFrame()
+    return history.pivot_table(index="Date", columns="Full Area Path", values="Health Score", aggfunc="last", observed=True)
+
+def period_deltas(history, day=None, days=7):
+    """
+    Latest snapshot per squad vs. the latest one at least `days` earlier
+    (week-over-week by default). Squads without an earlier snapshot get NaN deltas.
+    """
+    cols = ["Squad Name", "Full Area Path"] + DELTA_METRICS
+    if history.empty:
+        return pd.DataFrame(columns=cols + [f"Δ {m}" for m in DELTA_METRICS])
+    day = day or history["Date"].max()
+    h = history.astype({"Full Area Path": object, "Squad Name": object}).sort_values("Date")
+    current = h[h["Date"] <= day].groupby("Full Area Path").tail(1)
+    before = h[h["Date"] <= day - timedelta(days=days)].groupby("Full Area Path").tail(1)
+    out = current[cols].merge(before[["Full Area Path"] + DELTA_METRICS], on="Full Area Path", how="left", suffixes=("", " (prev)"))
+    for m in DELTA_METRICS:
+        out[f"Δ {m}"] = (out[m] - out[f"{m} (prev)"]).round(1)
+    return out.drop(columns=[f"{m} (prev)" for m in DELTA_METRICS]).reset_index(drop=True)
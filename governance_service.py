@@ -1,14 +1,33 @@
 import pandas as pd
 import requests
+import ado_http
+from fanout import fan_out, Incomplete
 import urllib.parse
 from datetime import datetime, timezone, timedelta
-from collections import defaultdict
+from area_rollup import AreaRollup
+from bug_rules import load_rules
+from work_items import WorkItemBatch
+
+BASE_FIELDS = [
+    "System.Id", "System.WorkItemType", "System.State",
+    "System.AreaPath", "Microsoft.VSTS.Scheduling.StoryPoints"
+]
+STAT_COLUMNS = ["Stories", "Closed", "Points", "Bugs", "SIT_Bugs", "UAT_Bugs", "Escaped"]
+
+ROLLUP_METRICS = {
+    "Total Stories": "Stories",
+    "Closed Stories": "Closed",
+    "Velocity (Points)": "Points",
+    "SIT Bugs": "SIT_Bugs",
+    "UAT Bugs": "UAT_Bugs",
+    "Bugs Found": "Bugs",
+}
 
 def get_area_governance_report(org, project, days, auth, story_types):
     columns = [
         "Squad Name", "Total Stories", "Closed Stories", 
         "Velocity (Points)", "SIT Bugs", "UAT Bugs", "Bugs Found", 
-        "Health Score", "Full Area Path"
+        "Escape Rate %", "Health Score", "Full Area Path"
     ]
     since_date = (datetime.now(timezone.utc) - timedelta(days=days)).strftime('%Y-%m-%d')
 
@@ -16,7 +35,7 @@ def get_area_governance_report(org, project, days, auth, story_types):
     wiql_url = f"https://dev.azure.com/{org}/{proj_encoded}/_apis/wit/wiql?api-version=7.1"
     
     query = {"query": f"SELECT [System.Id] FROM WorkItems WHERE [System.TeamProject] = '{project}' AND [System.ChangedDate] >= '{since_date}'"}
-    res = requests.post(wiql_url, json=query, auth=auth)
+    res = ado_http.post(wiql_url, json=query, auth=auth)
     
     if res.status_code != 200:
         return pd.DataFrame(columns=columns)
@@ -25,69 +44,115 @@ def get_area_governance_report(org, project, days, auth, story_types):
     if not ids:
         return pd.DataFrame(columns=columns)
 
-    # 2. Fetch Data 
-    # Added 'Custom.RaisedBy' to fields based on your second screenshot
+    # 2. Fetch Data
+    # Rule files decide which extra fields are needed (e.g. Custom.BugPhase, Custom.RaisedBy)
+    rules = load_rules(project)
     batch_url = f"https://dev.azure.com/{org}/_apis/wit/workitemsbatch?api-version=7.1"
-    fields = [
-        "System.Id", "System.WorkItemType", "System.State", 
-        "System.AreaPath", "Microsoft.VSTS.Scheduling.StoryPoints", 
-        "Custom.BugPhase",  # Field from screenshot 1
-        "Custom.RaisedBy"   # Field from screenshot 2
-    ]
-    wi_data = []
-    
-    for i in range(0, len(ids), 200):
-        payload = {"ids": ids[i:i+200], "fields": fields}
-        r = requests.post(batch_url, json=payload, auth=auth)
-        if r.status_code == 200:
-            wi_data.extend(r.json().get("value", []))
-
-    # 3. Process
-    stats = defaultdict(lambda: {"Stories": 0, "Bugs": 0, "SIT_Bugs": 0, "UAT_Bugs": 0, "Closed": 0, "Points": 0})
-    
-    for item in wi_data:
-        f = item.get("fields", {})
-        wtype = f.get("System.WorkItemType")
-        area = f.get("System.AreaPath", "Unassigned")
-        state = f.get("System.State")
-        pts = f.get("Microsoft.VSTS.Scheduling.StoryPoints", 0) or 0
-        
-        # Extracting the new logic fields
-        bug_phase = f.get("Custom.BugPhase", "")
-        raised_by = f.get("Custom.RaisedBy", "")
-
-        if wtype in story_types:
-            stats[area]["Stories"] += 1
-            stats[area]["Points"] += pts
-            if state in ["Closed", "Done", "Resolved", "Completed"]:
-                stats[area]["Closed"] += 1
-        
-        elif wtype == "Bug":
-            stats[area]["Bugs"] += 1
-            
-            # Identify if it is a UAT bug based on your query rules
-            is_uat = (bug_phase == "UAT") or (raised_by not in ["Aventra QA", "Aventra Developer"] and raised_by != "")
-            
-            if is_uat:
-                stats[area]["UAT_Bugs"] += 1
-            else:
-                # If it's not UAT, and it was raised by the internal team, it's a QA bug
-                stats[area]["SIT_Bugs"] += 1
+    fields = list(dict.fromkeys(BASE_FIELDS + sorted(rules.fields)))
+
+    # 3. Process — streaming: each 200-item page is classified and folded into the
+    # per-area counters as it arrives, then discarded. Memory is bounded by the id
+    # list, one page of payload and one counter row per area path.
+    def fetch_page(start):
+        r = ado_http.post(batch_url, json={"ids": ids[start:start+200], "fields": fields}, auth=auth)
+        r.raise_for_status()
+        return WorkItemBatch.from_payloads(r.json().get("value", []), extra_fields=rules.fields).ado_frame()
+
+    stats = pd.DataFrame(columns=STAT_COLUMNS, dtype="int64")
+    failed_pages = []
+    for start in range(0, len(ids), 200):
+        try:
+            page = fetch_page(start)
+        except requests.RequestException:
+            failed_pages.append(start)
+            continue
+        stats = stats.add(aggregate_by_area(page, rules, story_types), fill_value=0)
+
+    # Pages that failed (e.g. throttled) get fan_out's retry rounds; what still
+    # fails is reported, not silently left out of the counts
+    failed = {}
+    if failed_pages:
+        retried = fan_out(fetch_page, failed_pages)
+        for page in retried.results.values():
+            stats = stats.add(aggregate_by_area(page, rules, story_types), fill_value=0)
+        for start, error in retried.failed.items():
+            failed.update(dict.fromkeys(ids[start:start+200], error))
 
     # 4. Final Rows
+    stats = stats.astype({c: "int64" for c in STAT_COLUMNS if c != "Points"})
+    stats = stats[(stats["Stories"] > 0) | (stats["Bugs"] > 0)]
+    report = _report_rows(stats) if not stats.empty else pd.DataFrame(columns=columns)
+    if failed:
+        raise Incomplete(report, failed, "work items")
+    return report
+
+
+def _report_rows(stats):
+    # Escape Rate % counts bugs matching the rule file's "escape" classification.
+    # rules/default.json defines an escape as a UAT-phase bug, so with the
+    # default rules it equals UAT Bugs / Bugs Found; a project rule file can
+    # point "escape" at a classification of its own.
+    return pd.DataFrame({
+        "Squad Name": stats.index.str.split('\\').str[-1],
+        "Total Stories": stats["Stories"],
+        "Closed Stories": stats["Closed"],
+        "Velocity (Points)": stats["Points"],
+        "SIT Bugs": stats["SIT_Bugs"],
+        "UAT Bugs": stats["UAT_Bugs"],
+        "Bugs Found": stats["Bugs"],
+        "Escape Rate %": (stats["Escaped"] / stats["Bugs"].where(stats["Bugs"] > 0) * 100).round(1).fillna(0),
+        "Health Score": (stats["Closed"] / stats["Stories"].where(stats["Stories"] > 0) * 100).round(1).fillna(0),
+        "Full Area Path": stats.index
+    }).reset_index(drop=True)
+
+
+def aggregate_by_area(frame, rules, story_types):
+    """Per-area story / bug counters for one frame of batch `fields`, classified by `rules`."""
+    if frame.empty:
+        return pd.DataFrame(columns=STAT_COLUMNS, dtype="int64")
+
+    wtype = frame["System.WorkItemType"]
+    area = frame["System.AreaPath"].astype(object).fillna("Unassigned")
+    is_story = wtype.isin(story_types)
+    is_bug = wtype.eq("Bug")
+    closed = rules.is_closed(frame["System.State"])
+
+    bugs = frame[is_bug]
+    phase = rules.classify("phase", bugs) if "phase" in rules.classifications else pd.Series("SIT", index=bugs.index)
+    is_uat = pd.Series(False, index=frame.index)
+    is_uat[bugs.index] = phase.eq("UAT")
+    escaped = pd.Series(False, index=frame.index)
+    escaped[bugs.index] = rules.is_escape(bugs)
+
+    counters = pd.DataFrame({
+        "Stories": is_story,
+        "Closed": is_story & closed,
+        "Points": frame["Microsoft.VSTS.Scheduling.StoryPoints"].where(is_story, 0),
+        "Bugs": is_bug,
+        "SIT_Bugs": is_bug & ~is_uat,
+        "UAT_Bugs": is_bug & is_uat,
+        "Escaped": is_bug & escaped,
+    })
+    return counters.groupby(area, sort=False).sum()
+
+def build_governance_rollup(df):
+    """Aggregate the leaf squad rows of a governance report up the area tree."""
+    leaf_stats = {}
+    for row in df.to_dict("records"):
+        leaf_stats[row["Full Area Path"]] = {key: row.get(col, 0) for col, key in ROLLUP_METRICS.items()}
+    return AreaRollup(leaf_stats)
+
+
+def get_area_drilldown(rollup, path):
+    """One row for `path` itself followed by one row per direct child subtree."""
+    nodes = [rollup.node(path)] + rollup.children(path) if path in rollup else []
     rows = []
-    for path, d in stats.items():
-        if d["Stories"] == 0 and d["Bugs"] == 0: continue
+    for node in nodes:
+        d = node.total
         rows.append({
-            "Squad Name": path.split('\\')[-1],
-            "Total Stories": d["Stories"],
-            "Closed Stories": d["Closed"],
-            "Velocity (Points)": d["Points"],
-            "SIT Bugs": d["SIT_Bugs"],
-            "UAT Bugs": d["UAT_Bugs"],
-            "Bugs Found": d["Bugs"],
-            "Health Score": round((d["Closed"]/d["Stories"]*100), 1) if d["Stories"] > 0 else 0,
-            "Full Area Path": path
+            "Area": node.name if node.path != path else f"{node.name} (all)",
+            **{col: d.get(key, 0) for col, key in ROLLUP_METRICS.items()},
+            "Health Score": round((d.get("Closed", 0)/d["Stories"]*100), 1) if d.get("Stories") else 0,
+            "Full Area Path": node.path
         })
-
-    return pd.DataFrame(rows) if rows else pd.DataFrame(columns=columns)
\ No newline at end of file
+    return pd.DataFrame(rows)
@@ -0,0 +1,113 @@
+# hierarchy.py
+
+import pandas as pd
+from collections import defaultdict
+from config import STORY_TYPES, CLOSED_STATES
+
+PORTFOLIO_TYPES = ("Epic", "Feature")
+MAX_LEVELS = 5
+
+ROLLUP_COLUMNS = [
+    "Level", "ID", "Title", "State", "Parent", "Stories", "Closed Stories",
+    "Completion %", "Points", "Closed Points", "Bugs", "Open Bugs"
+]
+
+
+# ==================================================
+# HIERARCHY INDEX
+# ==================================================
+class HierarchyIndex:
+    """Parent/child index over loaded items plus any ancestors fetched to complete it."""
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.children = defaultdict(list)
+        for wid, item in nodes.items():
+            if item.get("parent") in nodes:
+                self.children[item["parent"]].append(wid)
+        self._portfolio = {}
+
+    def parent(self, wid):
+        p = self.nodes.get(wid, {}).get("parent")
+        return p if p in self.nodes else None
+
+    def portfolio_ancestors(self, wid):
+        """Feature/Epic ancestors of `wid`, nearest first (memoized per node)."""
+        if wid in self._portfolio:
+            return self._portfolio[wid]
+        chain, seen, p = [], {wid}, self.parent(wid)
+        while p is not None and p not in seen:
+            if p in self._portfolio:
+                chain.extend(self._portfolio[p] if self.nodes[p]["type"] not in PORTFOLIO_TYPES else [p] + self._portfolio[p])
+                break
+            seen.add(p)
+            if self.nodes[p]["type"] in PORTFOLIO_TYPES:
+                chain.append(p)
+            p = self.parent(p)
+        self._portfolio[wid] = chain
+        return chain
+
+
+def build_hierarchy(data_map, fetch_items, max_levels=MAX_LEVELS):
+    """
+    Complete the parent chain of every loaded item.
+
+    Parents outside `data_map` are fetched with `fetch_items(ids)` one level at
+    a time, so each level costs one bulk call regardless of how many children
+    point at it.
+    """
+    nodes = dict(data_map)
+    frontier = {i["parent"] for i in data_map.values() if i.get("parent")} - nodes.keys()
+    for _ in range(max_levels):
+        if not frontier:
+            break
+        fetched = fetch_items(list(frontier))
+        nodes.update(fetched)
+        frontier = {i["parent"] for i in fetched.values() if i.get("parent")} - nodes.keys()
+    return HierarchyIndex(nodes)
+
+
+# ==================================================
+# FEATURE / EPIC ROLLUPS
+# ==================================================
+def portfolio_rollup(index, scope_ids):
+    """Story completion, points and bug counts per Feature and Epic for the items in scope."""
+    acc = defaultdict(lambda: dict.fromkeys(["Stories", "Closed Stories", "Points", "Closed Points", "Bugs", "Open Bugs"], 0))
+
+    for wid in scope_ids:
+        item = index.nodes.get(wid)
+        if not item:
+            continue
+        t, closed = item["type"], item["state"] in CLOSED_STATES
+        pts = item.get("story_points") or 0
+        for anc in index.portfolio_ancestors(wid):
+            a = acc[anc]
+            if t in STORY_TYPES:
+                a["Stories"] += 1
+                a["Points"] += pts
+                if closed:
+                    a["Closed Stories"] += 1
+                    a["Closed Points"] += pts
+            elif t == "Bug":
+                a["Bugs"] += 1
+                if not closed: a["Open Bugs"] += 1
+
+    rows = []
+    for wid, a in acc.items():
+        node = index.nodes[wid]
+        parents = [p for p in index.portfolio_ancestors(wid) if index.nodes[p]["type"] == "Epic"]
+        rows.append({
+            "Level": node["type"],
+            "ID": wid,
+            "Title": node.get("title"),
+            "State": node.get("state"),
+            "Parent": parents[0] if parents else None,
+            **a,
+            "Completion %": round(a["Closed Stories"] / a["Stories"] * 100, 1) if a["Stories"] else 0.0,
+        })
+
+    if not rows:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS)
+    df = pd.DataFrame(rows)[ROLLUP_COLUMNS]
+    df["Parent"] = df["Parent"].astype("Int64")
+    return df.sort_values(["Level", "Points"], ascending=[True, False]).reset_index(drop=True)
@@ -0,0 +1,73 @@
+# history_store.py
+
+import os
+import json
+import zlib
+import sqlite3
+import threading
+from config import DATA_DIR
+
+DB_PATH = os.path.join(DATA_DIR, "closed_history.sqlite")
+
+_init_lock = threading.Lock()
+_initialized = False
+
+
+# ==================================================
+# PERMANENT STORE FOR CLOSED ITEMS' HISTORY
+# ==================================================
+# Closed work items rarely change, so their compact revision history is kept
+# on disk keyed by (org, id) together with the System.Rev it was built from.
+# A lookup only hits when the caller's current Rev still matches. Rows hold
+# identity ids since history_v2; name-based rows from the old table are
+# simply not read (they are re-downloaded once).
+
+def _connect():
+    global _initialized
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS history_v2 ("
+                    " org TEXT NOT NULL, id INTEGER NOT NULL, rev INTEGER NOT NULL, payload BLOB NOT NULL,"
+                    " PRIMARY KEY (org, id))"
+                )
+                conn.commit()
+                _initialized = True
+    return conn
+
+def get(org, wi_id, rev):
+    """Stored revisions for `wi_id` if they were built at exactly `rev`, else None."""
+    if rev is None or not os.path.exists(DB_PATH):
+        return None
+    try:
+        with _connect() as conn:
+            row = conn.execute("SELECT rev, payload FROM history_v2 WHERE org = ? AND id = ?", (org, wi_id)).fetchone()
+    except sqlite3.Error:
+        return None
+    if not row or row[0] != rev:
+        return None
+    return [tuple(r) for r in json.loads(zlib.decompress(row[1]))]
+
+def put(org, wi_id, rev, revisions):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    payload = zlib.compress(json.dumps(revisions).encode(), 6)
+    try:
+        with _connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO history_v2 (org, id, rev, payload) VALUES (?, ?, ?, ?)",
+                (org, wi_id, rev, payload)
+            )
+    except sqlite3.Error:
+        pass
+
+def forget(org, wi_id):
+    if not os.path.exists(DB_PATH):
+        return
+    try:
+        with _connect() as conn:
+            conn.execute("DELETE FROM history_v2 WHERE org = ? AND id = ?", (org, wi_id))
+    except sqlite3.Error:
+        pass
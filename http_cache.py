@@ -0,0 +1,194 @@
+# http_cache.py
+
+import os
+import json
+import time
+import zlib
+import hashlib
+import threading
+import requests
+from requests.structures import CaseInsensitiveDict
+from config import DATA_DIR
+
+CACHE_DIR = os.path.join(DATA_DIR, "http_cache")
+
+# Cache policies callers can ask for
+REVALIDATE = "revalidate"   # always ask the server, reuse the body on 304
+SWR = "swr"                 # serve fresh copy, or stale copy while refreshing in the background
+IMMUTABLE = "immutable"     # never re-download once stored
+
+SWR_MAX_AGE = int(os.environ.get("ADO_SWR_MAX_AGE", 3600))
+KEPT_HEADERS = ("ETag", "Last-Modified", "Content-Type")
+
+MAX_BYTES = int(float(os.environ.get("SPRINTDECK_HTTP_CACHE_MB", 512)) * 1024 * 1024)
+PRUNE_INTERVAL = 60   # seconds between size checks
+
+_refreshing = set()
+_lock = threading.Lock()
+_prune_lock = threading.Lock()
+_next_prune = 0.0
+
+
+# ==================================================
+# STORAGE
+# ==================================================
+def cache_key(method, url, scope=""):
+    return hashlib.sha256(f"{scope}|{method}|{url}".encode()).hexdigest()
+
+def _paths(key):
+    base = os.path.join(CACHE_DIR, key[:2], key)
+    return base + ".meta.json", base + ".body.z"
+
+def load(key):
+    meta_path, body_path = _paths(key)
+    try:
+        with open(meta_path, encoding="utf-8") as fh:
+            meta = json.load(fh)
+        with open(body_path, "rb") as fh:
+            body = zlib.decompress(fh.read())
+        return meta, body
+    except (OSError, ValueError, zlib.error):
+        return None
+
+def store(key, url, response):
+    meta_path, body_path = _paths(key)
+    os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+    meta = {
+        "url": url,
+        "status": response.status_code,
+        "headers": {h: response.headers[h] for h in KEPT_HEADERS if h in response.headers},
+        "stored_at": time.time(),
+    }
+    # Body first, then meta: a reader never sees meta pointing at a half-written body
+    _write_atomic(body_path, zlib.compress(response.content, 6))
+    _write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+    _maybe_prune()
+
+def _write_atomic(path, data):
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+def touch(key):
+    meta_path, _ = _paths(key)
+    cached = load(key)
+    if cached:
+        meta = cached[0]
+        meta["stored_at"] = time.time()
+        _write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+
+# Entries are dropped oldest-written first once the directory passes
+# MAX_BYTES (down to 90%, so the next few stores do not prune again). A
+# revalidated entry is rewritten by touch(), so what is still in use keeps
+# its place. At most one thread scans, at most once per PRUNE_INTERVAL.
+
+def _maybe_prune():
+    global _next_prune
+    now = time.monotonic()
+    if now < _next_prune or not _prune_lock.acquire(blocking=False):
+        return
+    try:
+        _next_prune = now + PRUNE_INTERVAL
+        prune()
+    finally:
+        _prune_lock.release()
+
+def prune(max_bytes=MAX_BYTES):
+    """Delete the oldest entries until the cache is under `max_bytes`; returns the number removed."""
+    entries, total = {}, 0
+    for root, _, files in os.walk(CACHE_DIR):
+        for name in files:
+            if name.endswith(".tmp"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue
+            key = name.split(".", 1)[0]
+            size, mtime, paths = entries.get(key, (0, 0.0, []))
+            entries[key] = (size + info.st_size, max(mtime, info.st_mtime), paths + [path])
+            total += info.st_size
+    if total <= max_bytes:
+        return 0
+    removed = 0
+    for size, _, paths in sorted(entries.values(), key=lambda e: e[1]):
+        if total <= max_bytes * 0.9:
+            break
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        total -= size
+        removed += 1
+    return removed
+
+def invalidate(method, url, scope=""):
+    for path in _paths(cache_key(method, url, scope)):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# ==================================================
+# RESPONSES
+# ==================================================
+def as_response(url, meta, body):
+    r = requests.Response()
+    r.status_code = meta["status"]
+    r._content = body
+    r.headers = CaseInsensitiveDict(meta["headers"])
+    r.url = url
+    r.from_cache = True
+    return r
+
+def conditional_headers(meta):
+    h = meta["headers"]
+    headers = {}
+    if "ETag" in h: headers["If-None-Match"] = h["ETag"]
+    if "Last-Modified" in h: headers["If-Modified-Since"] = h["Last-Modified"]
+    return headers
+
+
+# ==================================================
+# CACHED FETCH
+# ==================================================
+def fetch(send, url, policy, scope="", max_age=SWR_MAX_AGE, refresh=None):
+    """
+    `send(extra_headers)` performs the real GET. `refresh(fn)` runs fn off the
+    request path (used for stale-while-revalidate).
+    """
+    key = cache_key("GET", url, scope)
+    cached = load(key)
+
+    if cached and policy == IMMUTABLE:
+        return as_response(url, *cached)
+
+    if cached and policy == SWR:
+        if time.time() - cached[0]["stored_at"] < max_age:
+            return as_response(url, *cached)
+        if refresh is not None:
+            with _lock:
+                start = key not in _refreshing
+                _refreshing.add(key)
+            if start:
+                refresh(lambda: _revalidate(send, url, key, cached))
+            return as_response(url, *cached)
+
+    return _revalidate(send, url, key, cached)
+
+def _revalidate(send, url, key, cached):
+    try:
+        response = send(conditional_headers(cached[0]) if cached else {})
+        if response.status_code == 304 and cached:
+            touch(key)
+            return as_response(url, *cached)
+        if response.status_code == 200:
+            store(key, url, response)
+        return response
+    finally:
+        with _lock:
+            _refreshing.discard(key)
@@ -0,0 +1,151 @@
+# identities.py
+
+import os
+import re
+import sqlite3
+import threading
+from config import DATA_DIR
+
+DB_PATH = os.path.join(DATA_DIR, "identities.sqlite")
+
+NOBODY = 0   # no identity on the field (unassigned / unknown)
+
+# Older payloads (and some service hooks) carry identities as "Name <domain\\user>"
+_LEGACY = re.compile(r"^(.*?)\s*<([^<>]+)>\s*$")
+
+
+# ==================================================
+# IDENTITY INDEX
+# ==================================================
+# Every ADO identity (AssignedTo, ChangedBy, CreatedBy, PR createdBy) becomes
+# a small int the first time it is seen. It is keyed by uniqueName, then
+# descriptor, then id. All of those keys alias the same int, so a person
+# whose display name differs between payloads (or who was renamed) is one
+# row everywhere. Aggregations run on the ints; display names are looked up
+# only when a table or chart is drawn. The stored name is replaced only by
+# one from a newer payload (its ChangedDate), so replaying old revisions
+# that carry a former name neither flips it back nor writes to SQLite.
+#
+# Ids are allocated by SQLite, so they are stable across restarts and shared
+# by every process on the data dir (persisted revision histories and the
+# cpu_pool workers hold ids, not names).
+
+def _keys(identity):
+    if isinstance(identity, dict):
+        name = identity.get("displayName")
+        keys = [k for k in (
+            (identity.get("uniqueName") or "").lower(),
+            identity.get("descriptor"),
+            identity.get("id"),
+        ) if k]
+    elif isinstance(identity, str) and identity:
+        m = _LEGACY.match(identity)
+        name, keys = (m.group(1), [m.group(2).lower()]) if m else (identity, [])
+    else:
+        return None, []
+    if not keys and name:
+        keys = [f"name:{name.lower()}"]
+    return name, keys
+
+
+class IdentityIndex:
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._alias = {}
+        self._names = {NOBODY: None}
+        self._seen = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("CREATE TABLE IF NOT EXISTS identity (uid INTEGER PRIMARY KEY, name TEXT, seen TEXT)")
+        conn.execute("CREATE TABLE IF NOT EXISTS alias (key TEXT PRIMARY KEY, uid INTEGER NOT NULL)")
+        try:
+            conn.execute("ALTER TABLE identity ADD COLUMN seen TEXT")
+        except sqlite3.OperationalError:
+            pass   # already there
+        return conn
+
+    def _load(self, conn):
+        for uid, name, seen in conn.execute("SELECT uid, name, seen FROM identity"):
+            self._names[uid] = name
+            self._seen[uid] = seen
+        self._alias.update(conn.execute("SELECT key, uid FROM alias"))
+        self._loaded = True
+
+    def _newer(self, uid, seen):
+        if self._names.get(uid) is None:
+            return True
+        return seen is not None and seen > (self._seen.get(uid) or "")
+
+    def intern(self, identity, seen=None):
+        """
+        Int id for an ADO identity (dict or legacy string); NOBODY for
+        None/empty. `seen` is when the payload was written (ISO ChangedDate);
+        without it a different display name never replaces a stored one.
+        """
+        name, keys = _keys(identity)
+        if not keys:
+            return NOBODY
+        uid = next((self._alias[k] for k in keys if k in self._alias), None)
+        if uid is not None and all(k in self._alias for k in keys) and (
+            not name or self._names.get(uid) == name or not self._newer(uid, seen)
+        ):
+            return uid
+        return self._register(name, keys, seen)
+
+    def _register(self, name, keys, seen=None):
+        with self._lock:
+            try:
+                with self._connect() as conn:
+                    if not self._loaded:
+                        self._load(conn)
+                    # Another process may have registered the same person meanwhile
+                    for k in keys:
+                        row = conn.execute("SELECT uid FROM alias WHERE key = ?", (k,)).fetchone()
+                        if row:
+                            uid = row[0]
+                            break
+                    else:
+                        uid = conn.execute("INSERT INTO identity (name, seen) VALUES (?, ?)", (name, seen)).lastrowid
+                    conn.executemany("INSERT OR IGNORE INTO alias (key, uid) VALUES (?, ?)", [(k, uid) for k in keys])
+                    if name:
+                        # The row decides what is newer: another process may hold a later name
+                        conn.execute(
+                            "UPDATE identity SET name = ?, seen = ? WHERE uid = ? "
+                            "AND (name IS NULL OR (? IS NOT NULL AND ? > COALESCE(seen, '')))",
+                            (name, seen, uid, seen, seen)
+                        )
+                    self._names[uid], self._seen[uid] = conn.execute(
+                        "SELECT name, seen FROM identity WHERE uid = ?", (uid,)
+                    ).fetchone()
+            except sqlite3.Error:
+                # Unwritable data dir: keep the index in memory for this process
+                uid = next((self._alias[k] for k in keys if k in self._alias), None) or max(self._names) + 1
+                if (name and self._newer(uid, seen)) or uid not in self._names:
+                    self._names[uid], self._seen[uid] = name, seen
+            for k in keys:
+                self._alias.setdefault(k, uid)
+            return uid
+
+    def name(self, uid, default="Unknown"):
+        """Display name for `uid` (render time only)."""
+        if uid not in self._names and uid != NOBODY:
+            with self._lock:
+                try:
+                    with self._connect() as conn:
+                        self._load(conn)
+                except sqlite3.Error:
+                    pass
+        return self._names.get(uid) or default
+
+    def names(self, uids, default="Unknown"):
+        return [self.name(u, default) for u in uids]
+
+    def __len__(self):
+        return len(self._names) - 1
+
+
+identities = IdentityIndex()
@@ -1,6 +1,7 @@
 # iteration_utils.py
 
-import requests
+import ado_http
+from http_cache import SWR
 import urllib.parse
 import re
 import streamlit as st
@@ -18,7 +19,7 @@ def get_iteration_paths_with_dates(project):
         "_apis/wit/classificationnodes/iterations?$depth=10&api-version=7.0"
     )
 
-    r = requests.get(url, auth=AUTH)
+    r = ado_http.get(url, auth=AUTH, cache=SWR)
     r.raise_for_status()
 
     data = r.json()
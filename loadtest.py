@@ -0,0 +1,518 @@
+# loadtest.py
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import urllib.parse
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ==================================================
+# HEADLESS LOAD TEST
+# ==================================================
+# Drives the Governance, Delivery and Resource pipelines (the same functions
+# the views call, including single-flight, the request scheduler, the HTTP
+# cache and the shared revision repository) from N concurrent simulated
+# sessions against a local mock Azure DevOps, then reports latency
+# percentiles, request fan-out, peak memory and throttling.
+#
+#   python loadtest.py --sessions 20 --iterations 3 --projects 4 --items 400 --latency-ms 40
+#
+# st.cache_data is not in the loop, so every run is what a cache-miss rerun
+# costs. Sessions on the same project share in-flight work and the process
+# caches, like real users on one Streamlit worker; --projects controls how much
+# they overlap.
+#
+# --record saves the run's traffic as an ado_replay archive, and --replay
+# drives the same sessions from an archive (a mock fixture or a real triage
+# recording) with no network, as a performance regression fixture:
+#
+#   python loadtest.py --sessions 1 --iterations 1 --record fixture.jsonl.gz
+#   python loadtest.py --sessions 8 --replay fixture.jsonl.gz --replay-timing recorded
+
+ORG = "loadtest"
+USERS = [f"User {c}" for c in "ABCDEFGHIJKL"]
+
+def _identity(name):
+    return {"displayName": name, "uniqueName": f"{name.replace(' ', '.').lower()}@example.com"}
+
+STATES = ["New", "Active", "Resolved", "Closed"]
+ITEM_TYPES = ["User Story", "Bug", "Test Case", "User Story", "Product Backlog Item"]
+PROJECT_SPAN = 1_000_000
+FEATURE_BASE, EPIC_BASE = 900_000, 950_000
+VIEWS = ("governance", "delivery", "resource")
+
+
+# ==================================================
+# MOCK AZURE DEVOPS
+# ==================================================
+class MockADO:
+    """Deterministic synthetic ADO: every item is derived from its id, so nothing is stored."""
+
+    def __init__(self, projects, items, squads=6, latency=0.0, rate=0.0):
+        self.projects = list(projects)
+        self.items, self.squads, self.latency, self.rate = items, squads, latency, rate
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        self._tokens, self._stamp = rate, time.monotonic()
+        self.now = datetime.now(timezone.utc).replace(microsecond=0)
+
+    # --- synthetic data ---
+    def _project(self, wid):
+        return self.projects[wid // PROJECT_SPAN - 1]
+
+    def _fields(self, wid):
+        rng = random.Random(wid)
+        k, project = wid % PROJECT_SPAN, self._project(wid)
+        if k >= EPIC_BASE:
+            wtype = "Epic"
+        elif k >= FEATURE_BASE:
+            wtype = "Feature"
+        else:
+            wtype = ITEM_TYPES[k % len(ITEM_TYPES)]
+        return {
+            "System.Id": wid,
+            "System.Rev": 4,
+            "System.TeamProject": project,
+            "System.WorkItemType": wtype,
+            "System.State": rng.choice(STATES),
+            "System.Title": f"{wtype} {k}",
+            "System.AreaPath": f"{project}\\Squad {k % self.squads}",
+            "System.IterationPath": f"{project}\\Sprint {k % 4 + 1}",
+            "System.AssignedTo": _identity(rng.choice(USERS)),
+            "System.CreatedBy": _identity(rng.choice(USERS)),
+            "System.ChangedDate": (self.now - timedelta(days=k % 300)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "Microsoft.VSTS.Scheduling.StoryPoints": rng.choice([None, 1, 2, 3, 5, 8]),
+            "Microsoft.VSTS.Common.Severity": rng.choice(["1 - Critical", "2 - High", "3 - Medium", ""]),
+            "Custom.BugPhase": rng.choice(["", "", "UAT"]),
+            "Custom.RaisedBy": rng.choice(["", "Aventra QA", "Client"]),
+        }
+
+    def _relations(self, wid):
+        base, k = wid - wid % PROJECT_SPAN, wid % PROJECT_SPAN
+        wi = f"https://dev.azure.com/{ORG}/_apis/wit/workItems/"
+        if k >= EPIC_BASE:
+            return []
+        if k >= FEATURE_BASE:
+            return [{"rel": "System.LinkTypes.Hierarchy-Reverse", "url": f"{wi}{base + EPIC_BASE + k % 3}"}]
+        rels = [{"rel": "System.LinkTypes.Hierarchy-Reverse", "url": f"{wi}{base + FEATURE_BASE + k % 20}"}]
+        if ITEM_TYPES[k % len(ITEM_TYPES)] == "Bug" and k > 1:
+            rels.append({"rel": "System.LinkTypes.Related", "url": f"{wi}{wid - 1}"})
+        if k % 3 == 0:
+            rels.append({"rel": "ArtifactLink", "url": f"vstfs:///Git/PullRequestId/p%2Frepo{k % 5}%2F{wid}"})
+        return rels
+
+    def _revisions(self, wid):
+        f = self._fields(wid)
+        end = datetime.strptime(f["System.ChangedDate"], "%Y-%m-%dT%H:%M:%SZ")
+        rng = random.Random(-wid)
+        revs = []
+        for n, state in enumerate(["New", "Active", "Active", f["System.State"]]):
+            revs.append({"id": n + 1, "rev": n + 1, "fields": {
+                "System.Rev": n + 1,
+                "System.State": state,
+                "System.AssignedTo": _identity(rng.choice(USERS)) if n else f["System.AssignedTo"],
+                "System.ChangedBy": _identity(rng.choice(USERS)),
+                "System.ChangedDate": (end - timedelta(days=3 * (3 - n))).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            }})
+        return revs
+
+    # --- request handling ---
+    def _take_token(self):
+        if not self.rate:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def _count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def dispatch(self, method, path, query, body, headers):
+        if self.latency:
+            time.sleep(self.latency)
+        if not self._take_token():
+            self._count("429")
+            return 429, {"Retry-After": "1"}, {"message": "throttled"}
+
+        lower = path.lower()
+        if lower.endswith("/_apis/wit/wiql"):
+            self._count("wiql")
+            project = urllib.parse.unquote(path.split("/")[2])
+            if project not in self.projects:
+                return 404, {}, {}
+            base = (self.projects.index(project) + 1) * PROJECT_SPAN
+            return 200, {}, {"workItems": [{"id": base + k} for k in range(1, self.items + 1)]}
+
+        if lower.endswith("/_apis/wit/workitemsbatch"):
+            self._count("workitemsbatch")
+            wanted = body.get("fields")
+            value = []
+            for wid in body.get("ids", []):
+                f = self._fields(wid)
+                value.append({"id": wid, "rev": 4, "fields": {k: v for k, v in f.items() if not wanted or k in wanted}})
+            return 200, {}, {"count": len(value), "value": value}
+
+        m = re.search(r"/workitems/(\d+)/revisions$", lower)
+        if m:
+            self._count("revisions")
+            etag = f'"{m.group(1)}-4"'
+            if headers.get("If-None-Match") == etag:
+                self._count("304")
+                return 304, {"ETag": etag}, None
+            value = self._revisions(int(m.group(1)))
+            return 200, {"ETag": etag}, {"count": len(value), "value": value}
+
+        if lower.endswith("/_apis/wit/workitems") and "ids" in query:
+            self._count("workitems")
+            ids = [int(x) for x in query["ids"][0].split(",") if x]
+            return 200, {}, {"value": [{"id": i, "rev": 4, "fields": self._fields(i), "relations": self._relations(i)} for i in ids]}
+
+        m = re.search(r"/pullrequests/(\d+)$", lower)
+        if m:
+            self._count("pullrequests")
+            return 200, {}, {"pullRequestId": int(m.group(1)), "createdBy": _identity(random.Random(int(m.group(1))).choice(USERS))}
+
+        if lower.endswith("/_apis/projects"):
+            self._count("projects")
+            return 200, {}, {"value": [{"name": p} for p in self.projects]}
+
+        if "/classificationnodes/" in lower:
+            self._count("classificationnodes")
+            project = urllib.parse.unquote(path.split("/")[2])
+            return 200, {}, {"name": project, "children": [{"name": f"Squad {s}"} for s in range(self.squads)]}
+
+        self._count("404")
+        return 404, {}, {}
+
+    def start(self, host="127.0.0.1", port=0):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, method):
+                url = urllib.parse.urlsplit(self.path)
+                length = int(self.headers.get("Content-Length", 0) or 0)
+                body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+                status, headers, payload = mock.dispatch(method, url.path, urllib.parse.parse_qs(url.query), body, self.headers)
+                data = b"" if payload is None else json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._reply("GET")
+
+            def do_POST(self):
+                self._reply("POST")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="mock-ado", daemon=True).start()
+        return f"http://{host}:{self.server.server_address[1]}"
+
+    def total(self):
+        with self._lock:
+            return sum(v for k, v in self.counts.items() if k != "304")
+
+
+# ==================================================
+# REPLAYED TRAFFIC (--replay: an ado_replay archive instead of the mock)
+# ==================================================
+def _endpoint(url):
+    path = urllib.parse.urlsplit(url).path.lower().rstrip("/")
+    for name in ("wiql", "workitemsbatch", "revisions", "pullrequests", "classificationnodes", "workitems", "projects"):
+        if f"/{name}" in path:
+            return name
+    return path.rsplit("/", 1)[-1]
+
+class ReplayTraffic:
+    """Same counters the report reads from MockADO, taken from what the replayer served."""
+
+    def __init__(self, replayer):
+        self.replayer = replayer
+
+    @property
+    def counts(self):
+        counts = Counter()
+        for e in self.replayer.served():
+            status = e.get("status")
+            counts[str(status) if status in (304, 429) else _endpoint(e["url"])] += 1
+        return counts
+
+    def total(self):
+        return sum(v for k, v in self.counts.items() if k != "304")
+
+
+# ==================================================
+# MEMORY SAMPLER
+# ==================================================
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+class MemorySampler(threading.Thread):
+    def __init__(self, interval=0.2):
+        super().__init__(name="rss-sampler", daemon=True)
+        self.interval, self.peak, self._halt = interval, _rss_mb(), threading.Event()
+
+    def run(self):
+        while not self._halt.wait(self.interval):
+            self.peak = max(self.peak, _rss_mb())
+
+    def stop(self):
+        self._halt.set()
+        self.join()
+        return max(self.peak, _rss_mb())
+
+
+# ==================================================
+# SIMULATED VIEWS (imported lazily: env must be set first)
+# ==================================================
+def _views(auth):
+    from single_flight import flights, query_key
+    from governance_service import get_area_governance_report, build_governance_rollup
+    from delivery_service import load_delivery_data
+    from hierarchy import portfolio_rollup
+    from report_render import governance_workbook, summarize_delivery
+    import resource_view
+
+    story_types = resource_view.STORY_TYPES
+    org = resource_view.ORG   # same org everywhere, so the shared revision repository keys line up
+
+    def governance(project):
+        df = flights.do(
+            query_key("governance", project, 30),
+            lambda: get_area_governance_report(org, project, 30, auth, story_types)
+        )
+        if not df.empty:
+            build_governance_rollup(df)
+            governance_workbook(df, project, "load test")
+
+    def delivery(project):
+        path_filter = f"[System.AreaPath] UNDER '{project}'"
+        loaded = flights.do(
+            query_key("delivery", project, path_filter),
+            lambda: load_delivery_data(org, project, path_filter, auth)
+        )
+        if loaded is None:
+            raise RuntimeError("delivery query failed")
+        data_map, dev_results, hierarchy = loaded
+        summarize_delivery(data_map, dev_results)
+        portfolio_rollup(hierarchy, data_map.keys())
+
+    def resource(project):
+        days = resource_view.MAX_LOOKBACK_DAYS
+        index = flights.do(
+            query_key("resource", project, project, days, 0),
+            lambda: resource_view._build_attribution_index(auth, project, project, days)
+        )
+        for label in resource_view.PERIOD_TO_DAYS:
+            start, end = resource_view.period_range(label)
+            _, summary, _ = index.matrix(start, end)
+            stale = index.check_closed(start, summary)
+            if stale:
+                raise AssertionError(f"{label}: {len(stale)} items attributed after they closed, e.g. {stale[:5]}")
+
+    return {"governance": governance, "delivery": delivery, "resource": resource}
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def run(args):
+    from requests.auth import HTTPBasicAuth
+    from request_scheduler import scheduler, session_context, INTERACTIVE
+    import ado_replay
+
+    if args.replay:
+        # Offline: every view is answered from the archive (a recorded triage session or fixture)
+        mock = ReplayTraffic(ado_replay.start_replay(args.replay, args.replay_timing))
+        projects = mock.replayer.projects()
+        if not projects:
+            raise SystemExit(f"{args.replay}: no WIQL calls recorded, nothing to replay")
+    else:
+        projects = [f"Load{k}" for k in range(args.projects)] + [f"Calibrate-{v}" for v in VIEWS]
+        mock = MockADO(projects, args.items, latency=args.latency_ms / 1000, rate=args.mock_rate)
+        base_url = mock.start()
+        import ado_http
+        ado_http.BASE_URL = base_url
+    if args.record:
+        ado_replay.start_recording(args.record)
+
+    auth = HTTPBasicAuth("", "load-test-pat")
+    views = _views(auth)
+    selected = [v for v in args.views if v in views]
+
+    # Fan-out: one cold run of each view, single session, each on its own project.
+    # A replay instead probes every (view, project) pair once and keeps the
+    # pairs the archive can answer; the first that works gives the fan-out.
+    fanout = {}
+    if args.replay:
+        view_projects = {}
+        with session_context("load-calibration", INTERACTIVE):
+            for view in selected:
+                for project in projects:
+                    before, misses = dict(mock.counts), mock.replayer.misses
+                    try:
+                        views[view](project)
+                    except Exception:
+                        continue
+                    if mock.replayer.misses == misses:
+                        view_projects.setdefault(view, []).append(project)
+                        fanout.setdefault(view, {k: v - before.get(k, 0) for k, v in mock.counts.items() if v - before.get(k, 0)})
+        selected = [v for v in selected if v in view_projects]
+    else:
+        view_projects = dict.fromkeys(selected, projects[:args.projects])
+        with session_context("load-calibration", INTERACTIVE):
+            for view in selected:
+                before = dict(mock.counts)
+                views[view](f"Calibrate-{view}")
+                fanout[view] = {k: v - before.get(k, 0) for k, v in mock.counts.items() if v - before.get(k, 0)}
+    calibration_total, calibration_counts = mock.total(), Counter(mock.counts)
+
+    latencies, errors = defaultdict(list), Counter()
+    lock = threading.Lock()
+    baseline_mb = _rss_mb()
+    sampler = MemorySampler()
+    sampler.start()
+
+    def session(n):
+        rng = random.Random(n)
+        with session_context(f"load-session-{n}", INTERACTIVE):
+            for _ in range(args.iterations):
+                for view in rng.sample(selected, len(selected)):
+                    project = view_projects[view][n % len(view_projects[view])]
+                    t0 = time.perf_counter()
+                    try:
+                        views[view](project)
+                        ok = True
+                    except Exception:
+                        ok = False
+                    elapsed = (time.perf_counter() - t0) * 1000
+                    with lock:
+                        latencies[view].append(elapsed)
+                        if not ok: errors[view] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=session, args=(n,), name=f"load-session-{n}") for n in range(args.sessions)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    wall = time.perf_counter() - started
+    peak_mb = sampler.stop()
+    ado_replay.stop_recording()
+
+    budgets = list(scheduler.stats().values())
+    runs = sum(len(v) for v in latencies.values())
+    return {
+        "config": vars(args),
+        "views": {
+            v: {
+                "runs": len(latencies[v]),
+                "errors": errors[v],
+                "p50_ms": round(_percentile(latencies[v], 50), 1),
+                "p95_ms": round(_percentile(latencies[v], 95), 1),
+                "max_ms": round(max(latencies[v], default=0), 1),
+            } for v in selected
+        },
+        "fanout_cold": fanout,
+        "requests": {
+            "total": mock.total() - calibration_total,
+            "per_view_run": round((mock.total() - calibration_total) / runs, 1) if runs else 0,
+            "by_endpoint": dict(mock.counts - calibration_counts),
+        },
+        "throttling": {
+            "mock_429": mock.counts.get("429", 0),
+            "scheduler_throttles": sum(b["throttles"] for b in budgets),
+            "scheduler_wait_p95_ms": max((b["wait_p95_ms"] for b in budgets), default=0),
+            "concurrency_limit": max((b["limit"] for b in budgets), default=0),
+        },
+        "replay_misses": mock.replayer.misses if args.replay else 0,
+        "memory_mb": {"baseline": round(baseline_mb, 1), "peak": round(peak_mb, 1)},
+        "wall_s": round(wall, 2),
+        "throughput_runs_per_s": round(runs / wall, 2) if wall else 0,
+    }
+
+
+def print_report(r):
+    c = r["config"]
+    if c.get("replay"):
+        print(f"Sessions {c['sessions']} × {c['iterations']} iterations · replay {c['replay']} "
+              f"(timing {c['replay_timing']}) · {r['replay_misses']} misses")
+    else:
+        print(f"Sessions {c['sessions']} × {c['iterations']} iterations · {c['projects']} project(s) × {c['items']} items · "
+              f"mock latency {c['latency_ms']} ms · mock rate {c['mock_rate'] or '∞'}/s")
+    print(f"\n{'View':<12}{'runs':>6}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'cold fan-out':>14}")
+    for v, s in r["views"].items():
+        fan = sum(n for k, n in r["fanout_cold"].get(v, {}).items() if k not in ("304", "429"))
+        print(f"{v:<12}{s['runs']:>6}{s['errors']:>8}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['max_ms']:>10}{fan:>14}")
+    q, t, m = r["requests"], r["throttling"], r["memory_mb"]
+    print(f"\nRequests: {q['total']} under load ({q['per_view_run']} per view run) · by endpoint {q['by_endpoint']}")
+    print(f"Throttling: mock 429s {t['mock_429']} · scheduler throttles {t['scheduler_throttles']} · scheduler wait p95 {t['scheduler_wait_p95_ms']} ms · adaptive limit {t['concurrency_limit']}")
+    print(f"Memory: baseline {m['baseline']} MB · peak {m['peak']} MB")
+    print(f"Wall {r['wall_s']} s · {r['throughput_runs_per_s']} view runs/s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent-session load test against a mock Azure DevOps.")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=2)
+    parser.add_argument("--projects", type=int, default=2, help="distinct projects the sessions spread over")
+    parser.add_argument("--items", type=int, default=300, help="work items per project")
+    parser.add_argument("--views", nargs="+", default=list(VIEWS), choices=VIEWS)
+    parser.add_argument("--latency-ms", type=float, default=30.0, help="mock ADO response latency")
+    parser.add_argument("--mock-rate", type=float, default=0.0, help="mock ADO requests/s before 429s (0 = unlimited)")
+    parser.add_argument("--client-rate", type=float, help="override ADO_RATE_PER_SEC for the scheduler")
+    parser.add_argument("--max-in-flight", type=int, help="override ADO_MAX_IN_FLIGHT for the scheduler")
+    parser.add_argument("--record", help="record the run's ADO traffic to this archive (a replay fixture)")
+    parser.add_argument("--replay", help="drive the views from a recorded archive instead of the mock")
+    parser.add_argument("--replay-timing", default="recorded", choices=["recorded", "none"],
+                        help="sleep each replayed call for its recorded duration, or not at all")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    # Isolated caches, and scheduler limits, must be set before the app modules import
+    os.environ["SPRINTDECK_DATA_DIR"] = tempfile.mkdtemp(prefix="sprintdeck-load-")
+    os.environ.setdefault("SPRINTDECK_OFFLOAD_MIN_ROWS", str(sys.maxsize))
+    if args.client_rate:
+        os.environ["ADO_RATE_PER_SEC"] = str(args.client_rate)
+        os.environ["ADO_BURST"] = str(int(args.client_rate * 2))
+    if args.max_in_flight:
+        os.environ["ADO_MAX_IN_FLIGHT"] = str(args.max_in_flight)
+
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
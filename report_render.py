@@ -0,0 +1,206 @@
+# report_render.py
+
+import io
+from collections import defaultdict
+import pandas as pd
+
+from identities import NOBODY
+from work_item_links import linked_ids
+from config import STORY_TYPES, CLOSED_STATES
+
+
+# ==================================================
+# CPU-BOUND STAGES
+# ==================================================
+# Everything here is a top-level function over plain data so it can run in a
+# worker process: inputs and results are dicts, lists, DataFrames and bytes.
+# Only the renderers (small inputs, costly output) go through cpu_pool;
+# summarize_delivery runs inline, as pickling data_map costs more than it saves.
+
+def summarize_delivery(data_map, dev_results):
+    """
+    KPI counters, QA/bug-creator tallies and linkage rows for the Delivery
+    view. People are tallied by identity id; the view resolves names.
+    """
+    m_stats = {"ts": 0, "cs": 0, "bi": 0, "bf": 0, "tc": 0}
+    qa_activity, bug_creators, linkage_table = defaultdict(int), defaultdict(list), []
+    active_users, all_prs = set(), set()
+
+    # Bugs that hang off a story in this load (either side of the link)
+    story_linked = {
+        lid for i in data_map.values() if i["type"] in STORY_TYPES for lid in linked_ids(i)
+    }
+    story_linked.update(
+        wid for wid, i in data_map.items()
+        if i["parent"] in data_map and data_map[i["parent"]]["type"] in STORY_TYPES
+    )
+
+    for sid, item in data_map.items():
+        t, s, assigned, creator = item.type, item.state, item.assigned_id, item.created_id
+        if assigned != NOBODY: active_users.add(assigned)
+        for pr in item["pr_links"]: all_prs.add(pr)
+
+        if t in STORY_TYPES:
+            m_stats["ts"] += 1
+            if s in CLOSED_STATES: m_stats["cs"] += 1
+
+            # Linked bugs for this story, kept as plain (id, state) pairs
+            linked_bugs = [
+                (lid, data_map[lid]["state"])
+                for lid in linked_ids(item)
+                if lid in data_map and data_map[lid]["type"] == "Bug"
+            ]
+
+            linkage_table.append({
+                "Type": t,
+                "ID": sid,
+                "Title": item["title"],
+                "Status": s,
+                "Points": item.get("story_points", 0),
+                "Bugs": linked_bugs,
+                "Dev": dev_results.get(sid, "N/A")
+            })
+
+        elif t == "Bug":
+            m_stats["bi"] += 1
+            if s in CLOSED_STATES: m_stats["bf"] += 1
+            bug_creators[creator].append(f'{sid} ({s})')
+
+            # Independent bug entry in linkage table
+            # Only if it is not linked to a story
+            if sid not in story_linked:
+                linkage_table.append({
+                    "Type": t,
+                    "ID": sid,
+                    "Title": item["title"],
+                    "Status": s,
+                    "Points": 0,
+                    "Bugs": [],
+                    "Dev": dev_results.get(sid, "N/A")
+                })
+
+        elif t == "Test Case":
+            m_stats["tc"] += 1
+            qa_activity[assigned] += 1
+
+    return {
+        "m_stats": m_stats,
+        "qa_activity": dict(qa_activity),
+        "bug_creators": dict(bug_creators),
+        "linkage_table": linkage_table,
+        "active_users": active_users,
+        "all_prs": all_prs,
+    }
+
+def html_table(df, **to_html_kwargs):
+    return df.to_html(**to_html_kwargs)
+
+def excel_workbook(sheets, charts=()):
+    """
+    Render an .xlsx from `(sheet_name, df)` or `(sheet_name, df, startrow)`
+    entries; empty frames are skipped. `charts` are native chart specs bound
+    to the written ranges (see add_chart).
+    """
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
+        placed = {}
+        for name, df, *rest in sheets:
+            if df is not None and not df.empty:
+                startrow = rest[0] if rest else 0
+                df.to_excel(writer, sheet_name=name, index=False, startrow=startrow)
+                placed.setdefault((name, startrow), df)
+        for spec in charts:
+            key = (spec["sheet"], spec.get("startrow", 0))
+            if key in placed:
+                add_chart(writer, spec["sheet"], placed[key], spec, startrow=key[1])
+    return output.getvalue()
+
+
+# ==================================================
+# NATIVE EXCEL CHARTS
+# ==================================================
+# Charts reference the cells a frame was written to, so they stay live in
+# Excel (filter/edit the data and the chart follows) and cost a few hundred
+# bytes instead of an embedded bitmap.
+
+HEALTH_BANDS = ((70, "#28a745"), (40, "#ffc107"), (-1, "#dc3545"))
+
+def health_colors(scores):
+    """Per-point fills matching the dashboard's Healthy / Warning / Critical bands."""
+    return [{"fill": {"color": next(c for floor, c in HEALTH_BANDS if v > floor)}, "border": {"color": "black"}}
+            for v in scores]
+
+def add_chart(writer, sheet, df, spec, startrow=0):
+    """
+    Add a chart over `df` as written at `startrow` of `sheet`.
+
+    spec: categories (column), values (columns), optional type, title,
+    y_title, y_max, points (per-point formats), labels, into (sheet to
+    place the chart on, default `sheet`), anchor and size.
+    """
+    workbook = writer.book
+    n = len(df)
+    cat = df.columns.get_loc(spec["categories"])
+    chart = workbook.add_chart({"type": spec.get("type", "column")})
+    for value in spec["values"]:
+        col = df.columns.get_loc(value)
+        series = {
+            "name": [sheet, startrow, col],
+            "categories": [sheet, startrow + 1, cat, startrow + n, cat],
+            "values": [sheet, startrow + 1, col, startrow + n, col],
+        }
+        if spec.get("points"): series["points"] = spec["points"]
+        if spec.get("labels"): series["data_labels"] = {"value": True}
+        chart.add_series(series)
+
+    chart.set_title({"name": spec.get("title", "")})
+    y_axis = {"major_gridlines": {"visible": True, "line": {"dash_type": "dash", "color": "#d9d9d9"}}}
+    if spec.get("y_title"): y_axis["name"] = spec["y_title"]
+    if spec.get("y_max"): y_axis.update(min=0, max=spec["y_max"])
+    chart.set_y_axis(y_axis)
+    if len(spec["values"]) == 1:
+        chart.set_legend({"none": True})
+    width, height = spec.get("size", (720, 360))
+    chart.set_size({"width": width, "height": height})
+
+    into = spec.get("into", sheet)
+    target = writer.sheets.get(into) or workbook.add_worksheet(into)
+    writer.sheets[into] = target
+    target.insert_chart(spec.get("anchor", "H2"), chart)
+    return chart
+
+
+# ==================================================
+# GOVERNANCE REPORT
+# ==================================================
+def governance_workbook(df, project, generated_on, extra_sheets=()):
+    """Data sheet, a Dashboard sheet with a native health chart over it, and any `(name, df)` extra sheets."""
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        df.to_excel(writer, index=False, sheet_name='Data_Report')
+
+        if not df.empty:
+            workbook = writer.book
+            worksheet = workbook.add_worksheet('Dashboard')
+            writer.sheets['Dashboard'] = worksheet
+            header_format = workbook.add_format({'bold': True, 'font_size': 14, 'font_color': '#0078d4'})
+            worksheet.write('B2', f"Governance Report: {project}", header_format)
+            worksheet.write('B3', f"Generated on: {generated_on}")
+            add_chart(writer, 'Data_Report', df, {
+                "categories": "Squad Name",
+                "values": ["Health Score"],
+                "title": f"Squad Health Overview: {project}",
+                "y_title": "Health Score (%)",
+                "y_max": 110,
+                "points": health_colors(df["Health Score"]),
+                "labels": True,
+                "into": "Dashboard",
+                "anchor": "B5",
+                "size": (1000, 500),
+            })
+
+        for name, extra in extra_sheets:
+            if extra is not None and not extra.empty:
+                extra.to_excel(writer, index=False, sheet_name=name)
+
+    return output.getvalue()
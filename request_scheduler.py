@@ -0,0 +1,260 @@
+# request_scheduler.py
+
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+RATE_PER_SEC = float(os.environ.get("ADO_RATE_PER_SEC", 15))
+BURST = int(os.environ.get("ADO_BURST", 30))
+MAX_IN_FLIGHT = int(os.environ.get("ADO_MAX_IN_FLIGHT", 32))   # ceiling for the adaptive limit
+MIN_IN_FLIGHT = int(os.environ.get("ADO_MIN_IN_FLIGHT", 2))
+INITIAL_IN_FLIGHT = int(os.environ.get("ADO_INITIAL_IN_FLIGHT", 8))
+LATENCY_TOLERANCE = float(os.environ.get("ADO_LATENCY_TOLERANCE", 2.5))   # x the recent best latency
+LATENCY_SLACK = 0.05   # seconds; jitter on fast responses is not congestion
+
+_local = threading.local()
+
+
+# ==================================================
+# CALLER CONTEXT (session + priority)
+# ==================================================
+def _streamlit_session():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx(suppress_warning=True)
+        return ctx.session_id if ctx else None
+    except Exception:
+        return None
+
+def current_context():
+    session = getattr(_local, "session", None) or _streamlit_session() or threading.current_thread().name
+    priority = getattr(_local, "priority", None)
+    return session, INTERACTIVE if priority is None else priority
+
+@contextmanager
+def session_context(session, priority=INTERACTIVE):
+    prev = getattr(_local, "session", None), getattr(_local, "priority", None)
+    _local.session, _local.priority = session, priority
+    try:
+        yield
+    finally:
+        _local.session, _local.priority = prev
+
+def bind(fn):
+    """Carry the caller's session and priority into pool worker threads."""
+    session, priority = current_context()
+
+    def bound(*args, **kwargs):
+        with session_context(session, priority):
+            return fn(*args, **kwargs)
+    return bound
+
+
+# ==================================================
+# ADAPTIVE CONCURRENCY (AIMD)
+# ==================================================
+# How many requests a PAT may have in flight is learned, not fixed. Until
+# the first sign of congestion every completion adds 1 (slow start, doubling
+# per round trip); after that each uncongested completion while the window
+# is in use adds 1/limit (about +1 per round trip). A throttle halves the
+# limit and a latency spike beyond LATENCY_TOLERANCE x the recent best for
+# the same endpoint trims it by 10%. Baselines are per endpoint class: a
+# WIQL query is normally several times slower than a revisions read, and
+# one shared minimum would read every query as congestion. Decreases apply
+# at most once per cooldown, so a burst of 429s from one window counts once.
+
+class _AIMDLimit:
+    def __init__(self, initial, floor, ceiling, tolerance=LATENCY_TOLERANCE):
+        self.floor, self.ceiling, self.tolerance = floor, ceiling, tolerance
+        self.limit = float(min(max(initial, floor), ceiling))
+        self.latencies = {}   # endpoint class -> recent latencies
+        self.next_decrease = 0.0
+        self.slow_start = True
+        self.increases = self.decreases = 0
+
+    @property
+    def value(self):
+        return int(self.limit)
+
+    def _decrease(self, factor, now, latency):
+        if now < self.next_decrease:
+            return
+        self.limit = max(self.floor, self.limit * factor)
+        self.next_decrease = now + max(latency, 0.5)
+        self.slow_start = False
+        self.decreases += 1
+
+    def on_complete(self, latency, throttled, in_flight, now, endpoint=None):
+        if throttled:
+            self._decrease(0.5, now, latency)
+            return
+        window = self.latencies.setdefault(endpoint, deque(maxlen=200))
+        baseline = min(window) if window else latency
+        window.append(latency)
+        if len(window) >= 10 and latency > baseline * self.tolerance + LATENCY_SLACK:
+            self._decrease(0.9, now, latency)
+        elif in_flight + 1 >= self.limit / 2 and self.limit < self.ceiling:
+            self.limit = min(self.ceiling, self.limit + (1 if self.slow_start else 1 / self.limit))
+            self.increases += 1
+
+
+# ==================================================
+# PER-PAT BUDGET: TOKEN BUCKET + FAIR QUEUE
+# ==================================================
+class _Budget:
+    def __init__(self, rate, burst, max_in_flight):
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.concurrency = _AIMDLimit(INITIAL_IN_FLIGHT, MIN_IN_FLIGHT, max_in_flight)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.in_flight = 0
+        self.throttles = 0
+        self.served = 0
+        self.waits = deque(maxlen=500)
+        # priority -> session -> FIFO of waiting tickets; sessions rotate round-robin
+        self.queues = {p: OrderedDict() for p in PRIORITY_NAMES}
+        self.cond = threading.Condition()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _head(self):
+        for p in sorted(self.queues):
+            q = self.queues[p]
+            if q:
+                session, tickets = next(iter(q.items()))
+                return p, session, tickets[0]
+        return None
+
+    def _pop(self, priority, session):
+        q = self.queues[priority]
+        q[session].popleft()
+        if q[session]:
+            q.move_to_end(session)
+        else:
+            del q[session]
+
+    def _discard(self, priority, session, ticket):
+        q = self.queues[priority]
+        tickets = q.get(session)
+        if tickets is None:
+            return
+        try:
+            tickets.remove(ticket)
+        except ValueError:
+            return
+        if not tickets:
+            del q[session]
+
+    def acquire(self, session, priority):
+        ticket = object()
+        start = time.monotonic()
+        with self.cond:
+            self.queues[priority].setdefault(session, deque()).append(ticket)
+            granted = False
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    head = self._head()
+                    ready = (
+                        head is not None and head[2] is ticket
+                        and self.tokens >= 1 and self.in_flight < self.concurrency.value
+                        and now >= self.blocked_until
+                    )
+                    if ready:
+                        self._pop(priority, session)
+                        granted = True
+                        self.tokens -= 1
+                        self.in_flight += 1
+                        self.served += 1
+                        self.waits.append(now - start)
+                        self.cond.notify_all()
+                        return
+                    delay = max(self.blocked_until - now, (1 - self.tokens) / self.rate, 0.01)
+                    self.cond.wait(timeout=min(delay, 1.0))
+            finally:
+                if not granted:
+                    # Interrupted wait (e.g. KeyboardInterrupt, script stop): a ticket left
+                    # at the head would block every caller behind it
+                    self._discard(priority, session, ticket)
+                    self.cond.notify_all()
+
+    def release(self, retry_after=None, latency=None, endpoint=None):
+        with self.cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if retry_after is not None:
+                self.throttles += 1
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+            if latency is not None:
+                self.concurrency.on_complete(latency, retry_after is not None, self.in_flight, now, endpoint)
+            self.cond.notify_all()
+
+    def stats(self):
+        with self.cond:
+            waits = sorted(self.waits)
+            return {
+                "queued": {PRIORITY_NAMES[p]: sum(len(t) for t in q.values()) for p, q in self.queues.items()},
+                "sessions_waiting": len({s for q in self.queues.values() for s in q}),
+                "in_flight": self.in_flight,
+                "limit": self.concurrency.value,
+                "served": self.served,
+                "throttles": self.throttles,
+                "wait_avg_ms": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+                "wait_p95_ms": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 1) if waits else 0.0,
+            }
+
+
+# ==================================================
+# PROCESS-WIDE SCHEDULER
+# ==================================================
+class RequestScheduler:
+    """One budget per PAT, shared by every Streamlit session in the process."""
+
+    def __init__(self, rate=RATE_PER_SEC, burst=BURST, max_in_flight=MAX_IN_FLIGHT):
+        self.rate, self.burst, self.max_in_flight = rate, burst, max_in_flight
+        self._budgets = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def budget_key(auth):
+        secret = getattr(auth, "password", None) or ""
+        return hashlib.sha256(secret.encode()).hexdigest()[:12] if secret else "anonymous"
+
+    def _budget(self, auth):
+        key = self.budget_key(auth)
+        with self._lock:
+            if key not in self._budgets:
+                self._budgets[key] = _Budget(self.rate, self.burst, self.max_in_flight)
+            return self._budgets[key]
+
+    @contextmanager
+    def slot(self, auth, priority=None, endpoint=None):
+        session, ctx_priority = current_context()
+        budget = self._budget(auth)
+        budget.acquire(session, ctx_priority if priority is None else priority)
+        outcome = {"retry_after": None, "latency": None}
+        try:
+            yield outcome
+        finally:
+            budget.release(outcome["retry_after"], outcome["latency"], endpoint)
+
+    def stats(self):
+        with self._lock:
+            budgets = dict(self._budgets)
+        return {key: b.stats() for key, b in budgets.items()}
+
+
+scheduler = RequestScheduler()
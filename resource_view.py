@@ -1,17 +1,35 @@
-import requests
+import ado_http
 import urllib.parse
 import pandas as pd
-from collections import defaultdict
 import streamlit as st
-from concurrent.futures import ThreadPoolExecutor
-from io import BytesIO
+import cpu_pool
+from fanout import fan_out, Incomplete
+from http_cache import SWR
+from single_flight import flights, query_key
+from webhooks import generation as project_generation, cache_ttl
+from export_utils import parquet_download, PARQUET_MIME
+from revision_repository import revisions
+from attribution_index import AttributionBuilder
+from identities import identities
+from work_items import parse_work_item
+from flow_metrics import build_transitions, item_flow, flow_percentile_chart
+from report_render import excel_workbook
+from config import STORY_TYPES, CLOSED_STATES
 
 # ==================================================
 # CONSTANTS
 # ==================================================
 ORG = "lloydsregistergroup"
 
-STORY_TYPES = ["User Story", "Requirement", "Product Backlog Item"]
+RESOURCE_TYPES = STORY_TYPES + ["Bug", "Test Case"]
+
+# Only these types are attributed through revision history; Test Cases use the current assignee
+HISTORY_TYPES = set(STORY_TYPES) | {"Bug"}
+
+BATCH_FIELDS = [
+    "System.Id", "System.Rev", "System.WorkItemType", "System.State", "System.Title",
+    "System.AssignedTo", "System.ChangedDate", "Microsoft.VSTS.Scheduling.StoryPoints"
+]
 
 PERIOD_TO_DAYS = {
     "30 Days": 30,
@@ -20,190 +38,164 @@ PERIOD_TO_DAYS = {
     "180 Days": 180,
     "365 Days": 365
 }
+CALENDAR_PERIODS = ["This Quarter", "Last Quarter", "Custom Range"]
+
+# History is fetched for the shortest preset lookback that covers the selected
+# period (and its comparison); periods inside it are range queries on the index
+MAX_LOOKBACK_DAYS = max(PERIOD_TO_DAYS.values())
 
 # ==================================================
-# DEFAULT SUMMARY
+# USER ACTIVITY
 # ==================================================
-def default_summary():
-    return {
-        "Stories": 0,
-        "Bugs": 0,
-        "TestCases": 0,
-        "StoryPoints": 0,
-        "Items": []
-    }
+# The summary is normalized: every attributed work item is stored once in
+# summary["items"], and each user only holds row positions into that table.
+ITEM_COLUMNS = ["ID", "Type", "State", "StoryPoints", "Title"]
+
+def get_user_items(summary, user):
+    """Materialize one user's (identity id) activity rows from the shared item table."""
+    user_data = summary["users"].get(user)
+    if user_data is None or not len(user_data["ItemIdx"]):
+        return pd.DataFrame(columns=ITEM_COLUMNS)
+    return summary["items"].iloc[user_data["ItemIdx"]].reset_index(drop=True)
 
 # ==================================================
 # PERFORMANCE LAYER: PARALLEL HISTORY FETCH
 # ==================================================
-def get_contributors_from_history(wi_id, auth):
-    """Fetch all unique users assigned to a work item through history."""
-    url = f"https://dev.azure.com/{ORG}/_apis/wit/workitems/{wi_id}/revisions?api-version=7.0"
-    try:
-        r = requests.get(url, auth=auth, timeout=10)
-        if r.status_code != 200:
-            return set()
-
-        users = set()
-        for rev in r.json().get("value", []):
-            assigned_to = rev.get("fields", {}).get("System.AssignedTo")
-            if isinstance(assigned_to, dict):
-                users.add(assigned_to.get("displayName"))
-        return users
-    except Exception:
-        return set()
+def get_revision_history(wi_id, auth, closed=False, rev=None):
+    """Fetch a work item's compact revision history without retaining it in the shared repository."""
+    return revisions.get(ORG, None, wi_id, auth, closed=closed, rev=rev, keep=False)
 
 # ==================================================
 # DATA LAYER: OPTIMIZED MATRIX GENERATION
 # ==================================================
-@st.cache_data(ttl=3600)
-def get_resource_matrix(_auth, project, area_path, period_label):
-    days = PERIOD_TO_DAYS.get(period_label, 30)
+_cached_index = None
+
+def get_attribution_index(_auth, project, area_path, generation=0, days=MAX_LOOKBACK_DAYS):
+    # The TTL depends on whether the webhook receiver came up, which is only
+    # known once SprintDeck has tried to start it, so the cache is built on first use
+    global _cached_index
+    if _cached_index is None:
+        _cached_index = st.cache_data(ttl=cache_ttl())(_attribution_index)
+    return _cached_index(_auth, project, area_path, generation, days)
+
+def _attribution_index(_auth, project, area_path, generation=0, days=MAX_LOOKBACK_DAYS):
+    # Sessions that miss the cache together share one pipeline run
+    return flights.do(
+        query_key("resource", project, area_path, days, generation),
+        lambda: _build_attribution_index(_auth, project, area_path, days)
+    )
+
+def period_range(period_label, custom=None, today=None):
+    """[start, end) as UTC-naive Timestamps for a preset, calendar quarter or custom (date, date) range."""
+    today = pd.Timestamp(today or pd.Timestamp.now(tz="UTC").date())
+    end = today + pd.Timedelta(days=1)
+    if period_label in PERIOD_TO_DAYS:
+        return end - pd.Timedelta(days=PERIOD_TO_DAYS[period_label]), end
+    quarter = today.to_period("Q")
+    if period_label == "This Quarter":
+        return quarter.start_time, end
+    if period_label == "Last Quarter":
+        return (quarter - 1).start_time, quarter.start_time
+    start, last = custom
+    return pd.Timestamp(start), pd.Timestamp(last) + pd.Timedelta(days=1)
+
+def previous_range(start, end):
+    """The equal-length range immediately before [start, end) (a whole quarter for quarter starts)."""
+    if start.is_quarter_start and start == start.normalize():
+        q = start.to_period("Q")
+        return (q - 1).start_time, (q - 1).start_time + (end - start)
+    return start - (end - start), start
+
+def within_lookback(start, days=MAX_LOOKBACK_DAYS, today=None):
+    """True when `start` is inside a `days` lookback (the window an index built with `days` covers)."""
+    today = pd.Timestamp(today or pd.Timestamp.now(tz="UTC").date())
+    return start >= today - pd.Timedelta(days=days)
+
+def lookback_days(start, today=None):
+    """The shortest preset lookback that reaches back to `start` (None beyond MAX_LOOKBACK_DAYS)."""
+    return next((d for d in sorted(PERIOD_TO_DAYS.values()) if within_lookback(start, d, today)), None)
+
+def _build_attribution_index(_auth, project, area_path, days):
 
     wiql = f"""
     SELECT [System.Id]
     FROM WorkItems
     WHERE [System.TeamProject] = '{project}'
       AND [System.AreaPath] UNDER '{area_path}'
-      AND [System.WorkItemType] IN ('Bug','User Story','Requirement','Product Backlog Item')
+      AND [System.WorkItemType] IN ({", ".join(f"'{t}'" for t in RESOURCE_TYPES)})
       AND [System.ChangedDate] >= @today - {days}
     """
 
     url = f"https://dev.azure.com/{ORG}/{urllib.parse.quote(project)}/_apis/wit/wiql?api-version=7.0"
-    r = requests.post(url, json={"query": wiql}, auth=_auth)
+    r = ado_http.post(url, json={"query": wiql}, auth=_auth)
 
+    builder = AttributionBuilder()
     if r.status_code != 200 or not r.json().get("workItems"):
-        return pd.DataFrame(), {}
+        return builder.build()
 
     wi_ids = [item["id"] for item in r.json()["workItems"]]
 
-    # Fetch work items in batch
-    items_details = _fetch_work_items(wi_ids, _auth)
-
-    # Fetch histories in parallel
-    with ThreadPoolExecutor(max_workers=15) as executor:
-        history_map = dict(
-            executor.map(
-                lambda wid: (wid, get_contributors_from_history(wid, _auth)),
-                wi_ids
-            )
+    # Streaming fold: each 200-item page (details + revisions) is reduced to
+    # attribution events and per-item flow rows, then dropped. Histories are
+    # read with keep=False, so the fold adds nothing to the shared revision
+    # repository (whose own ceiling is MAX_ROWS, shared by every view). Peak
+    # memory is the id list, the compact events and flow rows (which grow
+    # with the items and revisions in `days`, the shortest preset covering the
+    # period asked for), plus one page in transit: up to 200 batch payloads
+    # and the compact histories of that page's Stories and Bugs, downloaded
+    # at most scheduler.max_in_flight at a time.
+    # Items whose page or history could not be loaded are collected, not
+    # folded in as "no activity", and reported once the index is built.
+    flow_parts, failed = [], {}
+
+    for page in _iter_work_item_pages(wi_ids, _auth, failed):
+        history_ids = [wid for wid, item in page.items() if item["type"] in HISTORY_TYPES]
+
+        # Fetch histories in parallel (Stories and Bugs only)
+        histories = fan_out(
+            lambda wid: get_revision_history(wid, _auth, page[wid]["state"] in CLOSED_STATES, page[wid]["rev"]),
+            history_ids
         )
+        failed.update(histories.failed)
+        flow_parts.append(item_flow(build_transitions(histories.results)))
 
-    summary = defaultdict(default_summary)
-
-    for wi_id, contributors in history_map.items():
-        item = items_details.get(wi_id)
-        if not item:
-            continue
+        for wi_id, history in histories.results.items():
+            builder.add_history(page[wi_id], history)
 
-        for user in contributors:
-            if user == "Unassigned":
-                continue
-
-            if item["type"] in STORY_TYPES:
-                summary[user]["Stories"] += 1
-                summary[user]["StoryPoints"] += item.get("story_points", 0)
-            elif item["type"] == "Bug":
-                summary[user]["Bugs"] += 1
-
-            summary[user]["Items"].append({
-                "ID": item["id"],
-                "Type": item["type"],
-                "State": item["state"],
-                "StoryPoints": item.get("story_points", 0),
-                "Title": item.get("title", "")
-            })
+        # Test cases are attributed to the current assignee at their last change
+        for item in page.values():
+            if item["type"] == "Test Case":
+                builder.add_current(item)
 
-    # Fetch test cases once
-    tc_counts = get_all_test_cases_by_user(_auth, project, area_path, days)
-    for user, count in tc_counts.items():
-        summary[user]["TestCases"] = count
-
-    rows = []
-    for user, s in summary.items():
-        rows.append({
-            "Resource": user,
-            "Stories": s["Stories"],
-            "Bugs": s["Bugs"],
-            "TestCases": s["TestCases"],
-            "StoryPoints": s["StoryPoints"]
-        })
-
-    df = pd.DataFrame(rows)
-    if df.empty:
-        return df, {}
-
-    df["Total Work Items"] = df["Stories"] + df["Bugs"] + df["TestCases"]
-    return df.sort_values(
-        ["StoryPoints", "Total Work Items"],
-        ascending=False
-    ), summary
+    flow_parts = [f for f in flow_parts if not f.empty]
+    flow_df = pd.concat(flow_parts, ignore_index=True) if flow_parts else item_flow(build_transitions({}))
+    index = builder.build(flow_df)
+    if failed:
+        raise Incomplete(index, failed, "work items")
+    return index
 
 # ==================================================
 # HELPERS
 # ==================================================
-def _fetch_work_items(ids, auth):
-    result = {}
+def _iter_work_item_pages(ids, auth, failed=None):
+    """Yield {id: item} one workitemsbatch page (200 ids) at a time; ids of failed pages go into `failed`."""
+    url = f"https://dev.azure.com/{ORG}/_apis/wit/workitemsbatch?api-version=7.0"
     for i in range(0, len(ids), 200):
-        batch = ids[i:i + 200]
-        url = (
-            f"https://dev.azure.com/{ORG}/_apis/wit/workitems"
-            f"?ids={','.join(map(str, batch))}&api-version=7.0"
-        )
-        r = requests.get(url, auth=auth)
-        if r.status_code == 200:
-            for item in r.json().get("value", []):
-                f = item["fields"]
-                result[item["id"]] = {
-                    "id": item["id"],
-                    "type": f.get("System.WorkItemType"),
-                    "state": f.get("System.State"),
-                    "title": f.get("System.Title"),
-                    "story_points": f.get(
-                        "Microsoft.VSTS.Scheduling.StoryPoints", 0
-                    )
-                }
-    return result
-
-@st.cache_data(ttl=3600)
-def get_all_test_cases_by_user(_auth, project, area_path, days):
-    wiql = f"""
-    SELECT [System.Id]
-    FROM WorkItems
-    WHERE [System.TeamProject] = '{project}'
-      AND [System.AreaPath] UNDER '{area_path}'
-      AND [System.WorkItemType] = 'Test Case'
-      AND [System.ChangedDate] >= @today - {days}
-    """
-
-    url = f"https://dev.azure.com/{ORG}/{urllib.parse.quote(project)}/_apis/wit/wiql?api-version=7.0"
-    r = requests.post(url, json={"query": wiql}, auth=_auth)
-
-    counts = defaultdict(int)
-    if r.status_code == 200:
-        ids = [w["id"] for w in r.json().get("workItems", [])]
-        for i in range(0, len(ids), 200):
-            batch = ids[i:i + 200]
-            b_url = (
-                f"https://dev.azure.com/{ORG}/_apis/wit/workitems"
-                f"?ids={','.join(map(str, batch))}"
-                f"&fields=System.AssignedTo&api-version=7.0"
-            )
-            res = requests.get(b_url, auth=_auth).json()
-            for item in res.get("value", []):
-                user = item["fields"].get("System.AssignedTo", {}).get(
-                    "displayName", "Unassigned"
-                )
-                if user != "Unassigned":
-                    counts[user] += 1
-    return counts
+        payload = {"ids": ids[i:i + 200], "fields": BATCH_FIELDS}
+        r = ado_http.post(url, json=payload, auth=auth)
+        if r.status_code != 200:
+            if failed is not None:
+                failed.update(dict.fromkeys(payload["ids"], f"HTTP {r.status_code}"))
+            continue
+        page = {item.id: item for item in map(parse_work_item, r.json().get("value", []))}
+        yield page
 
 # ==================================================
 # BASIC ADO HELPERS
 # ==================================================
 def get_projects(auth):
     url = f"https://dev.azure.com/{ORG}/_apis/projects?api-version=7.0"
-    r = requests.get(url, auth=auth)
+    r = ado_http.get(url, auth=auth, cache=SWR)
     return [p["name"] for p in r.json().get("value", [])] if r.status_code == 200 else []
 
 def get_area_paths(project, auth):
@@ -211,7 +203,7 @@ def get_area_paths(project, auth):
         f"https://dev.azure.com/{ORG}/{urllib.parse.quote(project)}"
         f"/_apis/wit/classificationnodes/areas?$depth=2&api-version=7.0"
     )
-    r = requests.get(url, auth=auth)
+    r = ado_http.get(url, auth=auth, cache=SWR)
     paths = []
 
     def walk(node, parent=""):
@@ -236,16 +228,82 @@ def render_resource_view(auth):
     with col2:
         area_path = st.selectbox("Area Path", get_area_paths(project, auth))
 
-    period = st.selectbox(
-        "📆 Contribution Lookback Period",
-        list(PERIOD_TO_DAYS.keys())
-    )
-
-    if st.button("🚀 Analyze Contributions", use_container_width=True):
+    p1, p2 = st.columns([2, 1])
+    with p1:
+        period = st.selectbox(
+            "📆 Contribution Lookback Period",
+            list(PERIOD_TO_DAYS.keys()) + CALENDAR_PERIODS
+        )
+    with p2:
+        compare = st.checkbox("Compare with previous period", key="matrix_compare")
+
+    custom = None
+    if period == "Custom Range":
+        today = pd.Timestamp.now(tz="UTC").date()
+        picked = st.date_input(
+            "Date Range",
+            value=(today - pd.Timedelta(days=30), today),
+            min_value=today - pd.Timedelta(days=MAX_LOOKBACK_DAYS),
+            max_value=today
+        )
+        if len(picked) == 2:
+            custom = picked
+
+    ready = period != "Custom Range" or custom
+    if st.button("🚀 Analyze Contributions", use_container_width=True, disabled=not ready):
+        # Load only as much history as this period (and its comparison, when it fits) needs
+        start, end = period_range(period, custom)
+        prev_start = previous_range(start, end)[0]
+        days = (compare and lookback_days(prev_start)) or lookback_days(start) or MAX_LOOKBACK_DAYS
         with st.spinner("Analyzing history..."):
-            df, summary = get_resource_matrix(auth, project, area_path, period)
-            st.session_state.matrix_df = df
-            st.session_state.matrix_summary = summary
+            try:
+                st.session_state.matrix_index = get_attribution_index(
+                    auth, project, area_path, project_generation(project), days
+                )
+                st.session_state.matrix_missing = 0
+            except Incomplete as e:
+                # Not cached: the next Analyze refetches, with loaded histories answered by the HTTP and history caches
+                st.session_state.matrix_index = e.value
+                st.session_state.matrix_missing = len(e.failed)
+            st.session_state.matrix_days = days
+
+    if st.session_state.get("matrix_missing"):
+        st.warning(
+            f"⚠️ {st.session_state.matrix_missing} work items could not be loaded from Azure DevOps after retries; "
+            "their contributions are missing from the counts below. Analyze again to retry them."
+        )
+
+    # Period changes only re-query the loaded index (no API calls)
+    index = st.session_state.get("matrix_index")
+    loaded_days = st.session_state.get("matrix_days", MAX_LOOKBACK_DAYS)
+    if index is not None and ready:
+        start, end = period_range(period, custom)
+        if not within_lookback(start, loaded_days):
+            st.info(
+                f"The loaded history covers the last {loaded_days} days; "
+                f"Analyze again to load it back to {start:%Y-%m-%d}."
+            )
+            return
+        df, summary, flow_df = index.matrix(start, end)
+        st.session_state.matrix_df = df
+        st.session_state.matrix_summary = summary
+        st.session_state.matrix_flow = flow_df
+        st.caption(f"{start:%Y-%m-%d} → {(end - pd.Timedelta(days=1)):%Y-%m-%d}")
+
+        prev = previous_range(start, end)
+        if compare and not within_lookback(prev[0]):
+            st.info(
+                f"Comparison needs history back to {prev[0]:%Y-%m-%d}, beyond the {MAX_LOOKBACK_DAYS}-day "
+                "maximum lookback; pick a shorter period to compare."
+            )
+        elif compare and not within_lookback(prev[0], loaded_days):
+            st.info(
+                f"Comparison needs history back to {prev[0]:%Y-%m-%d}; the loaded history covers the last "
+                f"{loaded_days} days. Analyze again to load it."
+            )
+        elif compare:
+            st.subheader(f"Change vs {prev[0]:%Y-%m-%d} → {(prev[1] - pd.Timedelta(days=1)):%Y-%m-%d}")
+            st.dataframe(index.compare((start, end), prev), use_container_width=True, hide_index=True)
 
     if "matrix_df" in st.session_state and not st.session_state.matrix_df.empty:
         df = st.session_state.matrix_df
@@ -253,67 +311,81 @@ def render_resource_view(auth):
 
         st.subheader("Performance Summary")
         st.dataframe(df, use_container_width=True, hide_index=True)
+        st.download_button(
+            "📥 Download Matrix (Excel)",
+            data=cpu_pool.deferred(excel_workbook, [("Resource_Matrix", df)], [
+                {"sheet": "Resource_Matrix", "type": "bar", "categories": "Resource",
+                 "values": ["Stories", "Bugs", "TestCases"], "title": "Work Items by Resource", "anchor": "H2",
+                 "size": (900, max(360, 22 * len(df)))},
+                {"sheet": "Resource_Matrix", "type": "bar", "categories": "Resource",
+                 "values": ["StoryPoints"], "title": "Story Points by Resource", "labels": True, "anchor": "W2",
+                 "size": (900, max(360, 22 * len(df)))},
+            ], rows=len(df)),
+            file_name=f"Resource_Matrix_{project}.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
+
+        flow_df = st.session_state.get("matrix_flow", pd.DataFrame())
+        fig_pct = flow_percentile_chart(flow_df, "Cycle & Lead Time Percentiles (days)") if not flow_df.empty else None
+        if fig_pct:
+            st.plotly_chart(fig_pct, use_container_width=True)
         st.divider()
 
         target_user = st.selectbox(
             "🔍 Detailed Activity Log (Select User)",
-            df["Resource"].tolist(),
+            df.index.tolist(),
+            format_func=identities.name,
             key="user_selector"
         )
+        target_name = identities.name(target_user)
 
-        if target_user in summary:
-            user_data = summary[target_user]
+        if target_user in summary["users"]:
+            user_data = summary["users"][target_user]
+            log_df = get_user_items(summary, target_user)
             m1, m2, m3 = st.columns(3)
             m1.metric("Stories Worked", user_data["Stories"])
             m2.metric("Bugs Worked", user_data["Bugs"])
             m3.metric("Total Story Points", user_data["StoryPoints"])
 
-            export_data = [{
-                "ID": item["ID"],
-                "Work Item Type": item["Type"],
-                "Title": item["Title"],
-                "State": item["State"],
-                "Story Points": item["StoryPoints"]
-            } for item in user_data["Items"]]
-
-            buffer = BytesIO()
-            with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
-                summary_df = pd.DataFrame({
-                    "Metric": [
-                        "Resource Name",
-                        "Stories",
-                        "Bugs",
-                        "Total Story Points"
-                    ],
-                    "Value": [
-                        target_user,
-                        user_data["Stories"],
-                        user_data["Bugs"],
-                        user_data["StoryPoints"]
-                    ]
-                })
-                summary_df.to_excel(
-                    writer,
-                    index=False,
-                    sheet_name="User_Activity_Log",
-                    startrow=0
-                )
-                pd.DataFrame(export_data).to_excel(
-                    writer,
-                    index=False,
-                    sheet_name="User_Activity_Log",
-                    startrow=6
-                )
+            export_data = log_df.rename(columns={
+                "Type": "Work Item Type",
+                "StoryPoints": "Story Points"
+            })[["ID", "Work Item Type", "Title", "State", "Story Points"]]
+
+            summary_df = pd.DataFrame({
+                "Metric": [
+                    "Resource Name",
+                    "Stories",
+                    "Bugs",
+                    "Total Story Points"
+                ],
+                "Value": [
+                    target_name,
+                    user_data["Stories"],
+                    user_data["Bugs"],
+                    user_data["StoryPoints"]
+                ]
+            })
+            workbook = cpu_pool.deferred(excel_workbook, [
+                ("User_Activity_Log", summary_df, 0),
+                ("User_Activity_Log", export_data, 6),
+            ], rows=len(export_data))
 
             st.download_button(
-                f"📥 Download Activity Log for {target_user}",
-                data=buffer.getvalue(),
-                file_name=f"Activity_Log_{target_user}.xlsx",
+                f"📥 Download Activity Log for {target_name}",
+                data=workbook,
+                file_name=f"Activity_Log_{target_name}.xlsx",
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                 use_container_width=True
             )
+            st.download_button(
+                "📦 Download Activity Log (Parquet)",
+                data=parquet_download(log_df),
+                file_name=f"Activity_Log_{target_name}.parquet",
+                mime=PARQUET_MIME,
+                use_container_width=True
+            )
 
-            log_df = pd.DataFrame(user_data["Items"])
             if not log_df.empty:
                 st.dataframe(
                     log_df[["ID", "Type", "Title", "State"]],
@@ -0,0 +1,68 @@
+# revision_history.py
+
+import ado_http
+import ado_replay
+import history_store
+from identities import identities
+from http_cache import REVALIDATE
+import urllib.parse
+
+# Compact revision rows: one tuple per revision, in revision order. People
+# are identity ids (0 = nobody); resolve them with identities.name to render.
+REV, STATE, ASSIGNED_TO, CHANGED_BY, CHANGED_DATE = range(5)
+
+
+def compact_revisions(values):
+    """Keep only the fields the dashboards read from a revisions payload."""
+    rows = []
+    for rev in values:
+        f = rev.get("fields", {})
+        rows.append((
+            rev.get("rev", f.get("System.Rev")),
+            f.get("System.State"),
+            identities.intern(f.get("System.AssignedTo"), f.get("System.ChangedDate")),
+            identities.intern(f.get("System.ChangedBy"), f.get("System.ChangedDate")),
+            f.get("System.ChangedDate"),
+        ))
+    return rows
+
+
+def revisions_url(org, project, work_item_id):
+    scope = f"{urllib.parse.quote(project)}/" if project else ""
+    return f"https://dev.azure.com/{org}/{scope}_apis/wit/workItems/{work_item_id}/revisions?api-version=7.0"
+
+
+def fetch_revisions(org, project, work_item_id, auth, timeout=10, closed=False, rev=None):
+    """
+    Download a work item's full revision history as compact rows. A failed
+    download raises (requests.HTTPError or the transport error) instead of
+    answering [], so callers never count a missing history as "no activity".
+
+    Closed items are answered from history_store while their System.Rev (from
+    the batch fetch) is unchanged, and stored there after a download. Every
+    download is revalidated with the stored ETag: a store miss means the Rev
+    moved (or is unknown), so an HTTP-cached body cannot be trusted blindly. While traffic is recorded or
+    replayed the store is skipped so the archive alone decides the answer.
+    """
+    if closed and not ado_replay.active():
+        stored = history_store.get(org, work_item_id, rev)
+        if stored is not None:
+            return stored
+
+    url = revisions_url(org, project, work_item_id)
+    r = ado_http.get(url, auth=auth, timeout=timeout, cache=REVALIDATE)
+    r.raise_for_status()
+    revisions = compact_revisions(r.json().get("value", []))
+
+    # Only persist a history that is complete up to the Rev the caller saw
+    if closed and rev is not None and revisions and revisions[-1][REV] == rev:
+        history_store.put(org, work_item_id, rev, revisions)
+    return revisions
+
+
+def assignees(revisions):
+    return {r[ASSIGNED_TO] for r in revisions if r[ASSIGNED_TO]}
+
+
+def changers(revisions):
+    return {r[CHANGED_BY] for r in revisions if r[CHANGED_BY]}
@@ -0,0 +1,78 @@
+# revision_repository.py
+
+import os
+import threading
+from collections import OrderedDict
+
+from revision_history import fetch_revisions, REV
+from single_flight import SingleFlight
+
+# Bound on cached revision rows (each row is a 5-tuple, roughly 300-400 bytes)
+MAX_ROWS = int(os.environ.get("SPRINTDECK_REVISION_CACHE_ROWS", 500_000))
+
+
+# ==================================================
+# SHARED REVISION REPOSITORY
+# ==================================================
+# Sprint, Kanban and Resource views all read the same compact histories.
+# Entries are keyed only by (org, work item id, System.Rev): a history at a
+# given Rev never changes, so whichever view or session asks first fills it
+# for everyone, and a new Rev simply misses. Derived summaries (developer in
+# progress, contributors) are computed from the cached rows, not cached apart.
+
+class RevisionRepository:
+    def __init__(self, max_rows=MAX_ROWS):
+        self.max_rows = max_rows
+        self._entries = OrderedDict()
+        self._rows = 0
+        self._lock = threading.Lock()
+        self._flights = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, org, project, work_item_id, auth, closed=False, rev=None, keep=True):
+        """Compact revisions for `work_item_id` at `rev` (uncached when the Rev is unknown).
+
+        With keep=False a cached history is still served, but a fetched one is
+        not added: bulk folds that only pass through each history once do not
+        push the views' working set out of the LRU.
+        """
+        if rev is None:
+            return fetch_revisions(org, project, work_item_id, auth, closed=closed, rev=rev)
+
+        key = (org, work_item_id, rev)
+        with self._lock:
+            revisions = self._entries.get(key)
+            if revisions is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return revisions
+            self.misses += 1
+
+        revisions = self._flights.do(key, lambda: fetch_revisions(org, project, work_item_id, auth, closed=closed, rev=rev))
+        # A history that stops short of the Rev asked for is a stale answer: never cache it under that Rev
+        if keep and revisions and revisions[-1][REV] is not None and revisions[-1][REV] >= rev:
+            self._put(key, revisions)
+        return revisions
+
+    def _put(self, key, revisions):
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = revisions
+            self._rows += len(revisions)
+            while self._rows > self.max_rows and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._rows -= len(evicted)
+
+    def forget(self, org, work_item_id):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == org and k[1] == work_item_id]:
+                self._rows -= len(self._entries.pop(key))
+
+    def stats(self):
+        with self._lock:
+            return {"items": len(self._entries), "rows": self._rows, "hits": self.hits, "misses": self.misses}
+
+
+revisions = RevisionRepository()
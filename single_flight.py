@@ -0,0 +1,76 @@
+# single_flight.py
+
+import threading
+
+
+# ==================================================
+# QUERY KEYS
+# ==================================================
+def query_key(view, *parts):
+    """Normalize (view, project, path filter, lookback, ...) so equivalent requests collide."""
+    norm = []
+    for p in parts:
+        if isinstance(p, str):
+            p = " ".join(p.split()).lower()
+        norm.append(p)
+    return (view,) + tuple(norm)
+
+
+# ==================================================
+# SINGLE-FLIGHT GROUP
+# ==================================================
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Process-wide de-duplication of identical in-flight computations.
+
+    The first caller for a key runs `fn`; every caller that arrives while it
+    is still running blocks and receives the same result (or exception).
+    Nothing is kept once the call completes — caching stays with st.cache_data.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result
+
+    def in_flight(self):
+        with self._lock:
+            return {key: call.waiters for key, call in self._calls.items()}
+
+
+flights = SingleFlight()
@@ -0,0 +1,164 @@
+# trend_store.py
+
+import os
+import json
+import threading
+import ado_http
+from request_scheduler import session_context, BACKGROUND
+from work_items import parse_work_item
+import urllib.parse
+import pandas as pd
+from datetime import datetime, timezone
+from config import STORY_TYPES, CLOSED_STATES, DATA_DIR, safe_name
+
+TREND_DIR = os.path.join(DATA_DIR, "trends")
+
+KPI_COLUMNS = ["Stories", "Closed", "Points", "Bugs Found", "Bugs Fixed", "Test Cases"]
+KPI_FIELDS = [
+    "System.Id", "System.WorkItemType", "System.State",
+    "Microsoft.VSTS.Scheduling.StoryPoints"
+]
+
+_lock = threading.Lock()
+_backfills = {}
+_failures = {}   # project -> {iteration path: error}, kept until a retry
+
+
+# ==================================================
+# KPI SNAPSHOT
+# ==================================================
+def compute_sprint_kpis(items):
+    """items: iterable of WorkItems (or dicts with type / state / story_points keys)."""
+    kpis = dict.fromkeys(KPI_COLUMNS, 0)
+    for item in items:
+        t, s = item["type"], item["state"]
+        if t in STORY_TYPES:
+            kpis["Stories"] += 1
+            kpis["Points"] += item.get("story_points") or 0
+            if s in CLOSED_STATES: kpis["Closed"] += 1
+        elif t == "Bug":
+            kpis["Bugs Found"] += 1
+            if s in CLOSED_STATES: kpis["Bugs Fixed"] += 1
+        elif t == "Test Case":
+            kpis["Test Cases"] += 1
+    return kpis
+
+
+# ==================================================
+# STORAGE (one small JSON document per project)
+# ==================================================
+def _trend_file(project):
+    return os.path.join(TREND_DIR, f"{safe_name(project)}.json")
+
+def _read(project):
+    try:
+        with open(_trend_file(project), encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+def save_snapshot(project, iteration, kpis, dates=None):
+    with _lock:
+        snapshots = _read(project)
+        snapshots[iteration] = {
+            **{k: kpis.get(k, 0) for k in KPI_COLUMNS},
+            "Start": (dates or {}).get("start"),
+            "End": (dates or {}).get("end"),
+            "Captured": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M"),
+        }
+        os.makedirs(TREND_DIR, exist_ok=True)
+        tmp = _trend_file(project) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(snapshots, fh)
+        os.replace(tmp, _trend_file(project))
+
+def load_trend(project):
+    """All stored sprint snapshots for a project, oldest sprint first (parent iterations left out)."""
+    snapshots = _read(project)
+    snapshots = {path: snapshots[path] for path in _leaves(snapshots)}
+    if not snapshots:
+        return pd.DataFrame(columns=["Iteration", "Sprint"] + KPI_COLUMNS + ["Start", "End", "Captured"])
+    df = pd.DataFrame([{"Iteration": path, **snap} for path, snap in snapshots.items()])
+    df["Sprint"] = df["Iteration"].str.split("\\").str[-1]
+    df["Closure %"] = (df["Closed"] / df["Stories"].where(df["Stories"] > 0) * 100).round(1).fillna(0)
+    return df.sort_values(["End", "Iteration"], na_position="first").reset_index(drop=True)
+
+
+# ==================================================
+# BULK BACKFILL OF CLOSED SPRINTS
+# ==================================================
+def fetch_sprint_kpis(org, project, iteration, auth):
+    wiql_url = f"https://dev.azure.com/{org}/{urllib.parse.quote(project)}/_apis/wit/wiql?api-version=7.0"
+    query = f"SELECT [System.Id] FROM WorkItems WHERE [System.IterationPath] UNDER '{iteration}'"
+    r = ado_http.post(wiql_url, json={"query": query}, auth=auth, timeout=30)
+    r.raise_for_status()
+    ids = [wi["id"] for wi in r.json().get("workItems", [])]
+
+    items = []
+    batch_url = f"https://dev.azure.com/{org}/_apis/wit/workitemsbatch?api-version=7.0"
+    for i in range(0, len(ids), 200):
+        res = ado_http.post(batch_url, json={"ids": ids[i:i+200], "fields": KPI_FIELDS}, auth=auth, timeout=30)
+        res.raise_for_status()
+        items.extend(map(parse_work_item, res.json().get("value", [])))
+    return compute_sprint_kpis(items)
+
+def _leaves(paths):
+    parents = set()
+    for path in paths:
+        parts = path.split("\\")
+        parents.update("\\".join(parts[:i]) for i in range(1, len(parts)))
+    return [p for p in paths if p not in parents]
+
+def closed_sprints_missing(project, date_map, today=None):
+    """
+    Finished leaf sprints with no snapshot, or whose snapshot was taken
+    before the sprint ended (a mid-sprint view). Parent iterations are
+    skipped: their UNDER query would count every child sprint again.
+    Sprints that failed to load are left out until retried.
+    """
+    today = today or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    stored = _read(project)
+    failed = _failures.get(project, {})
+    return [
+        path for path in _leaves(date_map)
+        if date_map[path]["end"] < today and path not in failed
+        and (stored.get(path, {}).get("Captured") or "")[:10] <= date_map[path]["end"]
+    ]
+
+def _run_backfill(org, project, auth, paths, date_map):
+    try:
+        with session_context(f"trend-backfill:{project}", BACKGROUND):
+            for path in paths:
+                try:
+                    save_snapshot(project, path, fetch_sprint_kpis(org, project, path, auth), date_map.get(path))
+                except Exception as e:
+                    with _lock:
+                        _failures.setdefault(project, {})[path] = f"{type(e).__name__}: {e}"
+    finally:
+        with _lock:
+            _backfills.pop(project, None)
+
+def start_backfill(org, project, auth, date_map, retry_failed=False):
+    """Snapshot every finished sprint not yet stored, on a background thread (once per project)."""
+    if retry_failed:
+        with _lock:
+            _failures.pop(project, None)
+    missing = closed_sprints_missing(project, date_map)
+    with _lock:
+        if not missing or project in _backfills:
+            return len(missing)
+        worker = threading.Thread(
+            target=_run_backfill, args=(org, project, auth, missing, date_map),
+            name=f"trend-backfill-{project}", daemon=True
+        )
+        _backfills[project] = worker
+    worker.start()
+    return len(missing)
+
+def backfill_running(project):
+    return project in _backfills
+
+def backfill_failures(project):
+    """Sprints the backfill could not load (path -> error); not retried until asked."""
+    with _lock:
+        return dict(_failures.get(project, {}))
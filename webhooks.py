@@ -0,0 +1,175 @@
+# webhooks.py
+
+import os
+import hmac
+import json
+import base64
+import threading
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import http_cache
+import history_store
+from request_scheduler import scheduler
+from revision_history import revisions_url
+from revision_repository import revisions
+from work_item_links import pull_request_url
+
+WEBHOOK_HOST = os.environ.get("SPRINTDECK_WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.environ.get("SPRINTDECK_WEBHOOK_PORT", 0))   # 0 = receiver disabled
+WEBHOOK_SECRET = os.environ.get("SPRINTDECK_WEBHOOK_SECRET", "")   # required: no secret, no receiver
+
+# With push invalidation in place, view caches can be held much longer
+PUSHED_CACHE_TTL = 6 * 3600
+POLLED_CACHE_TTL = 3600
+
+WORK_ITEM_EVENTS = ("workitem.created", "workitem.updated", "workitem.deleted", "workitem.restored")
+PR_EVENTS = ("git.pullrequest.created", "git.pullrequest.updated", "git.pullrequest.merged")
+
+_generations = {}
+_events = deque(maxlen=50)
+_lock = threading.Lock()
+_server = None
+
+
+# ==================================================
+# PROJECT GENERATIONS
+# ==================================================
+# Every change event for a project bumps its generation. Cached views take
+# the generation as an argument, so the next run after a change misses the
+# cache while untouched projects keep their entries.
+
+def generation(project):
+    with _lock:
+        return _generations.get(project.lower(), 0) if project else 0
+
+def bump(project):
+    if not project:
+        return
+    with _lock:
+        _generations[project.lower()] = _generations.get(project.lower(), 0) + 1
+
+def cache_ttl():
+    """View cache TTL: long only while this process's receiver is running (events bump generations)."""
+    return PUSHED_CACHE_TTL if receiver_running() else POLLED_CACHE_TTL
+
+def recent_events():
+    with _lock:
+        return list(_events)
+
+
+# ==================================================
+# EVENT HANDLING
+# ==================================================
+def _work_item_target(event_type, resource):
+    if event_type == "workitem.updated":
+        # The resource is the update; the item itself is under "revision"
+        return resource.get("workItemId"), resource.get("revision", {}).get("fields", {})
+    return resource.get("id"), resource.get("fields", {})
+
+def handle_event(payload, org, scope=""):
+    """
+    Apply one service-hook payload to the local caches.
+
+    Work item events drop that item's cached revision downloads, its shared
+    repository entries and stored closed history; PR events drop the cached
+    PR resource. Payloads are never written into a cache: the next read
+    fetches from Azure DevOps. Returns a short summary (None if the event
+    type is not handled).
+    """
+    event_type = payload.get("eventType", "")
+    resource = payload.get("resource") or {}
+
+    if event_type in WORK_ITEM_EVENTS:
+        wi_id, fields = _work_item_target(event_type, resource)
+        if not wi_id:
+            return None
+        project = fields.get("System.TeamProject")
+        for url in (revisions_url(org, project, wi_id), revisions_url(org, None, wi_id)):
+            http_cache.invalidate("GET", url, scope)
+        history_store.forget(org, wi_id)
+        revisions.forget(org, wi_id)
+        summary = {"event": event_type, "project": project, "id": wi_id}
+
+    elif event_type in PR_EVENTS:
+        repo, pr_id = resource.get("repository", {}).get("id"), resource.get("pullRequestId")
+        if not repo or not pr_id:
+            return None
+        project = resource.get("repository", {}).get("project", {}).get("name")
+        http_cache.invalidate("GET", pull_request_url(org, repo, pr_id), scope)
+        summary = {"event": event_type, "project": project, "id": pr_id}
+
+    else:
+        return None
+
+    bump(project)
+    with _lock:
+        _events.append({**summary, "received": datetime.now().strftime("%H:%M:%S")})
+    return summary
+
+
+# ==================================================
+# RECEIVER
+# ==================================================
+def _authorized(headers):
+    if not WEBHOOK_SECRET:
+        return False
+    token = headers.get("X-SprintDeck-Token", "")
+    auth = headers.get("Authorization", "")
+    if auth.startswith("Basic "):
+        try:
+            token = base64.b64decode(auth[6:]).decode("utf-8").partition(":")[2] or token
+        except ValueError:
+            pass
+    return hmac.compare_digest(token.encode(), WEBHOOK_SECRET.encode())
+
+def _make_handler(org, scope):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if not _authorized(self.headers):
+                self.send_response(401)
+                self.end_headers()
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self.send_response(400)
+                self.end_headers()
+                return
+            result = handle_event(payload, org, scope)
+            body = json.dumps({"handled": result is not None, **(result or {})}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+def start_receiver(org, auth, host=WEBHOOK_HOST, port=WEBHOOK_PORT):
+    """
+    Start the service-hook receiver once per process.
+
+    No-op when no port is configured, and when SPRINTDECK_WEBHOOK_SECRET is
+    unset: events drop caches and bump generations, so the receiver only
+    listens when every request can be authenticated.
+    """
+    global _server
+    if not port or not WEBHOOK_SECRET:
+        return None
+    with _lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, port), _make_handler(org, scheduler.budget_key(auth)))
+            except OSError:
+                return None   # port taken (another server process owns the receiver)
+            threading.Thread(target=_server.serve_forever, name="sprintdeck-webhooks", daemon=True).start()
+        return _server
+
+def receiver_running():
+    return _server is not None
@@ -0,0 +1,75 @@
+# work_item_links.py
+
+import urllib.parse
+
+CHILD = "System.LinkTypes.Hierarchy-Forward"
+PARENT = "System.LinkTypes.Hierarchy-Reverse"
+RELATED = "System.LinkTypes.Related"
+ARTIFACT = "ArtifactLink"
+
+PR_PREFIX = "vstfs:///Git/PullRequestId/"
+WORK_ITEM_SEGMENT = "/workItems/"
+
+
+def _work_item_id(url):
+    # .../_apis/wit/workItems/123 → 123
+    head, sep, tail = url.rpartition("/")
+    if sep and tail.isdigit() and head.lower().endswith(WORK_ITEM_SEGMENT[:-1].lower()):
+        return int(tail)
+    return None
+
+
+def _pull_request(url):
+    # vstfs:///Git/PullRequestId/{project}%2F{repo}%2F{pr} → (repo, pr)
+    if not url.startswith(PR_PREFIX):
+        return None
+    parts = urllib.parse.unquote(url[len(PR_PREFIX):]).split("/")
+    if len(parts) < 3 or not parts[-1].isdigit():
+        return None
+    return parts[-2], int(parts[-1])
+
+
+def pull_request_url(org, repo, pr_id):
+    return f"https://dev.azure.com/{org}/_apis/git/repositories/{repo}/pullrequests/{pr_id}?api-version=7.0"
+
+
+def parse_relations(relations):
+    """
+    Split a work item's `relations` by link type, once.
+
+    Returns typed values: an int parent id (or None), int tuples of children,
+    related and other work-item links, and (repository id, PR id) tuples.
+    """
+    parent, children, related, other, prs = None, [], [], [], []
+    for rel in relations or ():
+        kind, url = rel.get("rel", ""), rel.get("url", "")
+
+        if kind == ARTIFACT:
+            pr = _pull_request(url)
+            if pr: prs.append(pr)
+            continue
+
+        wid = _work_item_id(url)
+        if wid is None:
+            continue
+        if kind == PARENT:
+            parent = wid
+        elif kind == CHILD:
+            children.append(wid)
+        elif kind == RELATED:
+            related.append(wid)
+        else:
+            other.append(wid)
+
+    return {
+        "parent": parent,
+        "children": tuple(children),
+        "related": tuple(related),
+        "other": tuple(other),
+        "pr_links": tuple(dict.fromkeys(prs)),
+    }
+
+
+def linked_ids(item):
+    """Work items a story/bug is associated with for linkage (children, related and other peers)."""
+    return item["children"] + item["related"] + item["other"]
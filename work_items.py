@@ -0,0 +1,176 @@
+# work_items.py
+
+import numpy as np
+import pandas as pd
+
+from identities import identities, NOBODY
+from work_item_links import parse_relations
+
+# ADO field names read by the shared parser
+ID = "System.Id"
+REV = "System.Rev"
+TYPE = "System.WorkItemType"
+STATE = "System.State"
+TITLE = "System.Title"
+ASSIGNED_TO = "System.AssignedTo"
+CREATED_BY = "System.CreatedBy"
+AREA_PATH = "System.AreaPath"
+CHANGED_DATE = "System.ChangedDate"
+STORY_POINTS = "Microsoft.VSTS.Scheduling.StoryPoints"
+
+CORE_FIELDS = [ID, REV, TYPE, STATE, TITLE, ASSIGNED_TO, CREATED_BY, AREA_PATH, CHANGED_DATE, STORY_POINTS]
+
+UNASSIGNED = "Unassigned"
+UNKNOWN = "Unknown"
+
+
+# ==================================================
+# RECORD
+# ==================================================
+class WorkItem:
+    """
+    One parsed work item. Slotted (no per-item __dict__) and read-only by
+    convention; item["state"] / item.get("rev") also work, so call sites
+    written against the old dicts keep reading the same names.
+
+    People are identity ids (see identities.py); assigned_to / created_by
+    resolve the display name and are meant for rendering, not grouping.
+    """
+
+    __slots__ = (
+        "id", "rev", "type", "state", "title", "assigned_id", "created_id", "area_path",
+        "changed_date", "story_points", "parent", "children", "related", "other", "pr_links",
+    )
+
+    def __init__(self, id, rev=None, type=None, state=None, title=None, assigned_id=NOBODY,
+                 created_id=NOBODY, area_path=None, changed_date=None, story_points=0.0,
+                 parent=None, children=(), related=(), other=(), pr_links=()):
+        self.id, self.rev, self.type, self.state, self.title = id, rev, type, state, title
+        self.assigned_id, self.created_id, self.area_path = assigned_id, created_id, area_path
+        self.changed_date, self.story_points = changed_date, story_points
+        self.parent, self.children, self.related, self.other, self.pr_links = parent, children, related, other, pr_links
+
+    @property
+    def assigned_to(self):
+        return identities.name(self.assigned_id, UNASSIGNED)
+
+    @property
+    def created_by(self):
+        return identities.name(self.created_id, UNKNOWN)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def __getstate__(self):
+        return tuple(getattr(self, s) for s in self.__slots__)
+
+    def __setstate__(self, state):
+        for s, v in zip(self.__slots__, state):
+            setattr(self, s, v)
+
+    def __repr__(self):
+        return f"WorkItem({self.id}, {self.type!r}, {self.state!r})"
+
+
+def _points(value):
+    try:
+        return float(value) if value is not None else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+def parse_work_item(payload):
+    """The one place ADO work-item JSON (batch, ids or webhook `resource`) becomes a WorkItem."""
+    f = payload.get("fields", {})
+    links = parse_relations(payload["relations"]) if payload.get("relations") else {}
+    return WorkItem(
+        payload.get("id", f.get(ID)),
+        rev=payload.get("rev", f.get(REV)),
+        type=f.get(TYPE),
+        state=f.get(STATE),
+        title=f.get(TITLE),
+        assigned_id=identities.intern(f.get(ASSIGNED_TO), f.get(CHANGED_DATE)),
+        created_id=identities.intern(f.get(CREATED_BY), f.get(CHANGED_DATE)),
+        area_path=f.get(AREA_PATH),
+        changed_date=f.get(CHANGED_DATE),
+        story_points=_points(f.get(STORY_POINTS)),
+        **links
+    )
+
+
+# ==================================================
+# COLUMNAR BATCH
+# ==================================================
+class WorkItemBatch:
+    """
+    Work items as columns: ids/revs/points/identity ids as numpy arrays,
+    type, state, people and area dictionary-encoded (one small category
+    table plus int codes), and any extra raw ADO fields (e.g. rule inputs)
+    alongside. Display names are resolved once per distinct identity.
+    """
+
+    def __init__(self, columns, extra=None):
+        self.columns = columns
+        self.extra = extra if extra is not None else pd.DataFrame(index=range(len(columns["id"])))
+
+    @classmethod
+    def from_items(cls, items):
+        items = list(items)
+        columns = {
+            "id": np.fromiter((i.id for i in items), dtype=np.int64, count=len(items)),
+            "rev": pd.array([i.rev for i in items], dtype="Int32"),
+            "title": np.array([i.title for i in items], dtype=object),
+            "story_points": np.fromiter((i.story_points for i in items), dtype=np.float64, count=len(items)),
+            "changed_date": pd.to_datetime(pd.Series([i.changed_date for i in items], dtype=object), utc=True, format="ISO8601").array,
+            "parent": pd.array([i.parent for i in items], dtype="Int64"),
+            "assigned_id": np.fromiter((i.assigned_id for i in items), dtype=np.int32, count=len(items)),
+            "created_id": np.fromiter((i.created_id for i in items), dtype=np.int32, count=len(items)),
+        }
+        for name in ("type", "state", "area_path"):
+            columns[name] = pd.Categorical([getattr(i, name) for i in items])
+        for name, ids, default in (("assigned_to", "assigned_id", UNASSIGNED), ("created_by", "created_id", UNKNOWN)):
+            codes, uniques = pd.factorize(columns[ids])
+            columns[name] = pd.Categorical(np.asarray(identities.names(uniques, default), dtype=object)[codes])
+        return cls(columns)
+
+    @classmethod
+    def from_payloads(cls, values, extra_fields=()):
+        """Parse a page of ADO JSON once; `extra_fields` are kept raw for rule evaluation."""
+        values = list(values)
+        batch = cls.from_items(parse_work_item(v) for v in values)
+        extra = [f for f in extra_fields if f not in CORE_FIELDS]
+        if extra:
+            batch.extra = pd.DataFrame([{k: v.get("fields", {}).get(k) for k in extra} for v in values], columns=extra)
+        return batch
+
+    def __len__(self):
+        return len(self.columns["id"])
+
+    def __iter__(self):
+        """Materialize row records (without relations, which the batch does not keep)."""
+        cols = [self.columns[c] for c in ("id", "rev", "type", "state", "title", "assigned_id", "created_id", "area_path", "story_points", "parent")]
+        for i in range(len(self)):
+            wid, rev, t, s, title, a, c, area, pts, parent = (col[i] for col in cols)
+            yield WorkItem(int(wid), rev=None if pd.isna(rev) else int(rev), type=t, state=s, title=title,
+                           assigned_id=int(a), created_id=int(c), area_path=area, story_points=float(pts),
+                           parent=None if pd.isna(parent) else int(parent))
+
+    def frame(self, columns=None):
+        """DataFrame keyed by model names (categoricals stay dictionary-encoded)."""
+        df = pd.DataFrame({k: v for k, v in self.columns.items() if columns is None or k in columns})
+        return df[list(columns)] if columns is not None else df
+
+    def ado_frame(self):
+        """DataFrame keyed by ADO field names plus the raw extra fields, for the rule engine."""
+        c = self.columns
+        df = pd.DataFrame({
+            ID: c["id"], REV: c["rev"], TYPE: c["type"], STATE: c["state"], TITLE: c["title"],
+            ASSIGNED_TO: c["assigned_to"], CREATED_BY: c["created_by"], AREA_PATH: c["area_path"],
+            STORY_POINTS: c["story_points"],
+        })
+        return pd.concat([df, self.extra], axis=1) if len(self.extra.columns) else df